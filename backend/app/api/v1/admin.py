@@ -0,0 +1,40 @@
+import hmac
+import logging
+
+from fastapi import APIRouter, Depends, Header
+
+from backend.app.core.config import settings
+from backend.app.core.exceptions import AdminAuthError
+from backend.app.schemas.request import ModelReloadRequest
+from backend.app.schemas.response import ModelInfoResponse
+from backend.app.services.ml_service import model_info, reload_model
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: str = Header("")):
+    if not settings.ADMIN_TOKEN:
+        raise AdminAuthError("Admin endpoints are disabled")
+    # bytes: compare_digest raises TypeError on non-ASCII str
+    token = x_admin_token.encode()
+    if not hmac.compare_digest(token, settings.ADMIN_TOKEN.encode()):
+        raise AdminAuthError()
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/model", response_model=ModelInfoResponse)
+def get_model():
+    return model_info()
+
+
+@router.post("/model/reload", response_model=ModelInfoResponse)
+async def post_model_reload(request: ModelReloadRequest | None = None):
+    """
+    Load a model version in the background and swap it in without
+    interrupting requests
+    """
+    version = request.version if request else None
+    logger.info(f"Model reload requested: {version or 'current'}")
+    return await reload_model(version)
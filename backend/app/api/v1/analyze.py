@@ -1,21 +1,51 @@
+import asyncio
+import json
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List
-
-from fastapi import APIRouter
-
-from backend.app.core.exceptions import MLServiceError
-from backend.app.schemas.request import AnalyzePRRequest
-from backend.app.schemas.response import AnalyzePRResponse
+from typing import Awaitable, Callable, Dict, List
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from backend.app.core import metrics
+from backend.app.core.config import settings
+from backend.app.core.exceptions import (
+    ApplicationError,
+    GitHubAPIError,
+    InvalidPullRequestURLError,
+    MLServiceError,
+)
+from backend.app.schemas.request import AnalyzeBatchRequest, AnalyzePRRequest
+from backend.app.schemas.response import AnalyzeBatchResponse, AnalyzePRResponse
 
+from backend.app.services import analysis_store
 from backend.app.services.github_service import (
+    fetch_changed_files,
+    fetch_contributing,
+    fetch_open_pr_numbers,
     fetch_pr,
     fetch_pr_files,
+    gather_lookups,
 )
 
-from backend.app.services.ml_service import predict_risk
-from backend.app.services.llm_service import generate_review
-from backend.app.services.diff_selector import build_selected_patch
+from backend.app.services.ml_service import predict_risk, predict_risk_batch
+from backend.app.services.llm_service import (
+    REVIEW_MODEL,
+    diff_token_budget,
+    generate_review,
+    generate_summary,
+    stream_review,
+)
+from backend.app.services.diff_selector import (
+    MAX_PATCH_FILES,
+    build_patch_shards,
+    build_selected_patch,
+    packed_files,
+)
+from backend.app.services.single_flight import SingleFlight
 
 from backend.app.utils.pr_parser import parse_pr_url
 
@@ -23,6 +53,30 @@ from backend.app.utils.pr_parser import parse_pr_url
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Extra GitHub lookups fetched alongside the PR and its files.
+# Each entry maps an llm_context key to a callable (owner, repo, pr_number)
+# returning an awaitable; failures resolve to None instead of failing the
+# request.
+OPTIONAL_LOOKUPS: Dict[str, Callable[[str, str, int], Awaitable]] = {
+    "contributing": lambda owner, repo, _: fetch_contributing(owner, repo),
+}
+
+_github_flight = SingleFlight("github_fetch")
+_analysis_flight = SingleFlight("analysis")
+
+
+@contextmanager
+def _stage(stages: Dict | None, name: str):
+    # stage timings go to /metrics and, for jobs, into the job record
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.observe(f"analyze.stage.{name}", seconds)
+        if stages is not None:
+            stages[name] = round(seconds, 4)
+
 # Helper: Safe datetime parsing
 
 def parse_github_datetime(dt_str: str | None) -> datetime | None:
@@ -93,51 +147,448 @@ def build_ml_input(pr: Dict, files: List[Dict]) -> Dict:
     }
 
 
-@router.post("/analyze/pr", response_model=AnalyzePRResponse)
-async def analyze_pr(request: AnalyzePRRequest):
+# Build LLM Input
 
-    logger.info("Analyze PR request received")
+def build_llm_context(
+    pr: Dict,
+    files: List[Dict],
+    ml_result: Dict,
+    extra: Dict | None = None,
+    previous_findings: List[Dict] | None = None,
+) -> Dict:
+    """
+    previous_findings are the reused reviews of files that are not sent
+    again; they only feed the PR-wide risk explanation and mitigation steps.
+    """
+    selected_patch = build_selected_patch(
+        files_data=files,
+        risk_score=ml_result["risk_score"],
+        top_risk_factors=ml_result.get("top_risk_factors"),
+        token_budget=diff_token_budget(),
+    )
+    shards = build_patch_shards(
+        files_data=files,
+        risk_score=ml_result["risk_score"],
+        top_risk_factors=ml_result.get("top_risk_factors"),
+        token_budget=diff_token_budget(),
+        max_shards=settings.LLM_MAX_SHARDS,
+    ) if settings.LLM_MAX_SHARDS > 1 else []
+
+    return {
+        "risk_label": ml_result["risk_label"],
+        "risk_score": ml_result["risk_score"],
+        "top_risk_factors": ml_result.get("top_risk_factors", []),
+
+        "title": pr.get("title", ""),
+        "body": pr.get("body", ""),
+        "file_names": [f.get("filename") for f in files],
+        "selected_patch": selected_patch,
+        "shards": shards,
+        "previous_findings": [r for r in previous_findings or [] if r["issues"]],
+        **(extra or {}),
+    }
+
+
+async def _fetch_github_data(owner: str, repo: str, pr_number: int) -> Dict:
+    return await gather_lookups(
+        required={
+            "pr": fetch_pr(owner, repo, pr_number),
+            "files": fetch_pr_files(
+                owner, repo, pr_number, keep_patches=MAX_PATCH_FILES
+            ),
+        },
+        optional={
+            name: lookup(owner, repo, pr_number)
+            for name, lookup in OPTIONAL_LOOKUPS.items()
+        },
+    )
+
+
+# Incremental review
+
+async def _plan_review(pr_key: tuple, pr: Dict, files: List[Dict]) -> Dict:
+    """
+    Work out which files need a fresh LLM review. Files the compare API
+    reports as untouched since the last analyzed head keep that analysis'
+    review; any other file reuses a stored review of the same patch.
+    """
+    head_sha = (pr.get("head") or {}).get("sha")
+    previous = await analysis_store.latest(pr_key)
+
+    unchanged = set()
+    if previous is not None and head_sha:
+        if previous["head_sha"] == head_sha:
+            unchanged = {f.get("filename") for f in files}
+        else:
+            owner, repo, _ = pr_key
+            changed = await fetch_changed_files(
+                owner, repo, previous["head_sha"], head_sha
+            )
+            if changed is not None:
+                unchanged = {f.get("filename") for f in files} - changed
+
+    reused, pending, keys = await analysis_store.plan(
+        files, REVIEW_MODEL, previous, unchanged
+    )
+    return {
+        "head_sha": head_sha,
+        "previous": previous,
+        "reused": reused,
+        "pending": pending,
+        "keys": keys,
+    }
+
+
+def _reused_review(plan: Dict, files: List[Dict], ml_result: Dict) -> Dict | None:
+    """
+    With nothing left to review, the previous analysis' summary still holds
+    as long as the risk label is the same; if the label changed, every file
+    is reviewed again. Without a previous analysis of this PR (every file
+    matched a review stored for another PR, e.g. a cherry-pick or backport)
+    the reviews are kept and only the PR-wide summary is written.
+    Returns None when the LLM has to be called for plan["pending"] (or, if
+    that is empty, for the summary).
+    """
+    previous = plan["previous"]
+    if plan["pending"] or previous is None:
+        return None
+    if previous.get("risk_label") != ml_result["risk_label"]:
+        plan["pending"] = [f for f in files if f.get("patch") is not None]
+        plan["reused"] = {}
+        return None
+
+    return {
+        "risk_explanation": previous["risk_explanation"],
+        "mitigation_steps": previous["mitigation_steps"],
+        "file_reviews": [],
+        "source": "llm",
+        "cached": True,
+    }
+
+
+def _llm_context(
+    plan: Dict, pr: Dict, files: List[Dict], ml_result: Dict, extra: Dict
+) -> Dict:
+    # summary-only passes still list every file of the PR
+    return build_llm_context(
+        pr, plan["pending"] or files, ml_result, extra, _reused_findings(plan, files)
+    )
+
+
+async def _finish_review(
+    pr_key: tuple,
+    files: List[Dict],
+    ml_result: Dict,
+    plan: Dict,
+    context: Dict | None,
+    review: Dict,
+) -> Dict:
+    """
+    Merge fresh file reviews with reused ones and store the analysis.
+    A pending file's review is only stored once the model has seen its diff
+    (it is in the packed patch) or reviewed it, so files squeezed out of the
+    token budget stay pending. For a sharded review only the shards that
+    succeeded count; a failed shard's files stay pending too.
+    """
+    review = dict(review)
+    reviewed = review.pop("reviewed_files", None)
+    reused, keys = plan["reused"], plan["keys"]
+    fresh = {r["file"]: r for r in review.get("file_reviews", [])}
 
-    owner, repo, pr_number = parse_pr_url(str(request.pr_url))
+    merged = [
+        fresh.get(f.get("filename")) or reused.get(f.get("filename"))
+        for f in files
+    ]
+    merged = [r for r in merged if r is not None and r["issues"]]
+
+    if review.get("source") == "fallback":
+        return {**review, "file_reviews": merged}
+
+    stored = {name: keys[name] for name in reused}
+    seen = set()
+    if context and context.get("shards"):
+        for shard in context["shards"]:
+            seen |= packed_files(shard["selected_patch"])
+        seen &= set(reviewed or [])
+    elif context:
+        seen = packed_files(context["selected_patch"])
+    for file in plan["pending"]:
+        name = file.get("filename")
+        if name in fresh or name in seen:
+            await analysis_store.store_file_review(
+                keys[name], fresh.get(name) or {"file": name, "issues": []}
+            )
+            stored[name] = keys[name]
+
+    if plan["head_sha"]:
+        await analysis_store.store_analysis(pr_key, plan["head_sha"], {
+            "risk_label": ml_result["risk_label"],
+            "risk_score": ml_result["risk_score"],
+            "risk_explanation": review.get("risk_explanation"),
+            "mitigation_steps": review.get("mitigation_steps"),
+            "files": stored,
+        })
+
+    return {**review, "file_reviews": merged}
+
+
+def _reused_findings(plan: Dict, files: List[Dict]) -> List[Dict]:
+    return [
+        plan["reused"][f.get("filename")]
+        for f in files
+        if f.get("filename") in plan["reused"]
+    ]
 
-    pr = await fetch_pr(owner, repo, pr_number)
-    files = await fetch_pr_files(owner, repo, pr_number)
+
+async def _run_analysis(
+    github_data: Dict, pr_key: tuple, stages: Dict | None = None
+) -> Dict:
+    extra = dict(github_data)
+    pr = extra.pop("pr")
+    files = extra.pop("files")
 
     ml_input = build_ml_input(pr, files)
     logger.info(f"ML INPUT KEYS: {list(ml_input.keys())}")
 
     try:
-        ml_result = await predict_risk(ml_input)
+        with _stage(stages, "predict"):
+            ml_result = await predict_risk(ml_input, routing_key=pr.get("html_url"))
         logger.info(f"ML OUTPUT: {ml_result}")
     except Exception as e:
         logger.error(f"ML prediction failed: {e}")
         raise MLServiceError("ML prediction failed.")
 
-    selected_patch = build_selected_patch(
-        files_data=files,
-        risk_score=ml_result["risk_score"],
-    )
+    with _stage(stages, "review"):
+        plan = await _plan_review(pr_key, pr, files)
+        review = _reused_review(plan, files, ml_result)
+        context = None
+        if review is None:
+            context = _llm_context(plan, pr, files, ml_result, extra)
+            if plan["pending"]:
+                review = await generate_review(context)
+            else:
+                review = await generate_summary(context)
+        review = await _finish_review(pr_key, files, ml_result, plan, context, review)
+
+    logger.info(f"LLM OUTPUT: {review}")
 
-    llm_context = {
+    return {
         "risk_label": ml_result["risk_label"],
         "risk_score": ml_result["risk_score"],
-        "top_risk_factors": ml_result.get("top_risk_factors", []),
-
-        "title": pr.get("title", ""),
-        "body": pr.get("body", ""),
-        "file_names": [f.get("filename") for f in files],
-        "diff_summary": selected_patch,
+        "review_comments": review,
+        "ai_unavailable": review.get("source") == "fallback",
+        "model_version": ml_result.get("model_version"),
     }
 
-    review = await generate_review(llm_context)
 
-    logger.info(f"LLM OUTPUT: {review}")
+async def run_pr_analysis(pr_url: str, stages: Dict | None = None) -> Dict:
+    """
+    Full analysis of one PR. Shared by the synchronous endpoint and the
+    analyze_pr background job; predict/review stage timings are recorded by
+    whichever caller actually runs the analysis.
+    """
+    owner, repo, pr_number = parse_pr_url(pr_url)
+    pr_key = (owner.lower(), repo.lower(), pr_number)
+
+    # concurrent requests for the same PR share the GitHub fetch, and for the
+    # same head commit share the ML + LLM analysis
+    with _stage(stages, "fetch"):
+        github_data = await _github_flight.do(
+            pr_key,
+            lambda: _fetch_github_data(owner, repo, pr_number),
+        )
+
+    head_sha = (github_data["pr"].get("head") or {}).get("sha")
+    with _stage(stages, "analysis"):
+        result = await _analysis_flight.do(
+            (*pr_key, head_sha),
+            lambda: _run_analysis(github_data, pr_key, stages),
+        )
 
     # ---------------- Final Response ----------------
     return {
-    "risk_label": ml_result["risk_label"],
-    "risk_score": ml_result["risk_score"],
-    "review_comments": review,
-    "pr_url": str(request.pr_url),
-    "ai_unavailable": review.get("source") == "fallback"
-}
\ No newline at end of file
+        **result,
+        "pr_url": pr_url,
+    }
+
+
+async def analyze_pr_job(payload: Dict, stages: Dict) -> Dict:
+    return await run_pr_analysis(payload["pr_url"], stages)
+
+
+@router.post("/analyze/pr", response_model=AnalyzePRResponse)
+async def analyze_pr(request: AnalyzePRRequest):
+
+    logger.info("Analyze PR request received")
+
+    return await run_pr_analysis(str(request.pr_url))
+
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_analysis(pr_url: str):
+    try:
+        owner, repo, pr_number = parse_pr_url(pr_url)
+        pr_key = (owner.lower(), repo.lower(), pr_number)
+
+        with _stage(None, "fetch"):
+            github_data = await _github_flight.do(
+                pr_key,
+                lambda: _fetch_github_data(owner, repo, pr_number),
+            )
+
+        extra = dict(github_data)
+        pr = extra.pop("pr")
+        files = extra.pop("files")
+
+        with _stage(None, "predict"):
+            ml_result = await predict_risk(
+                build_ml_input(pr, files), routing_key=pr.get("html_url")
+            )
+
+        # the score goes out before the LLM is even called
+        yield _sse("risk", {**ml_result, "pr_url": pr_url})
+
+        plan = await _plan_review(pr_key, pr, files)
+        review = _reused_review(plan, files, ml_result)
+        context = None
+
+        for file in files:
+            reused = plan["reused"].get(file.get("filename"))
+            if reused is not None and reused["issues"]:
+                yield _sse("file_review", reused)
+
+        if review is None:
+            context = _llm_context(plan, pr, files, ml_result, extra)
+            if plan["pending"]:
+                async for event, data in stream_review(context):
+                    if event == "review":
+                        review = data
+                    else:
+                        yield _sse(event, data)
+            else:
+                review = await generate_summary(context)
+
+        review = await _finish_review(pr_key, files, ml_result, plan, context, review)
+        yield _sse("review", review)
+
+        yield _sse("done", {
+            "ai_unavailable": review.get("source") == "fallback",
+        })
+
+    except ApplicationError as e:
+        logger.error(f"Streaming analysis failed: {e.message}")
+        yield _sse("error", {"message": e.message})
+    except Exception:
+        # the response has already started, so the exception handlers
+        # in main.py can't turn this into an error response
+        logger.exception("Streaming analysis failed")
+        yield _sse("error", {
+            "message": "Unexpected server error. Please try again later."
+        })
+
+
+@router.get("/analyze/pr/stream")
+async def analyze_pr_stream(
+    pr_url: str = Query(..., description="GitHub Pull Request URL"),
+):
+    """
+    Server-Sent Events: "risk" (ML score, immediately), one "file_review"
+    per file as the LLM produces it, the full "review", then "done".
+    Failures after the stream started arrive as an "error" event.
+    """
+    try:
+        request = AnalyzePRRequest(pr_url=pr_url)
+    except ValidationError:
+        raise InvalidPullRequestURLError()
+
+    logger.info("Streaming analyze PR request received")
+
+    return StreamingResponse(
+        _stream_analysis(str(request.pr_url)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/analyze/batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(request: AnalyzeBatchRequest):
+    """
+    Score many PRs with one vectorized model call. GitHub fetches and, if
+    requested, LLM reviews run concurrently (bounded).
+    """
+
+    targets = [parse_pr_url(str(url)) for url in request.pr_urls]
+
+    if request.repo:
+        owner, repo = request.repo.split("/")
+        numbers = await fetch_open_pr_numbers(
+            owner, repo, limit=settings.BATCH_MAX_PRS
+        )
+        targets += [(owner, repo, number) for number in numbers]
+
+    # de-duplicate while keeping order
+    targets = list(dict.fromkeys(targets))[:settings.BATCH_MAX_PRS]
+    logger.info(f"Batch analysis request received for {len(targets)} PRs")
+
+    fetch_slots = asyncio.Semaphore(settings.BATCH_FETCH_CONCURRENCY)
+    keep_patches = MAX_PATCH_FILES if request.include_review else 0
+
+    async def fetch_one(owner: str, repo: str, pr_number: int):
+        async with fetch_slots:
+            try:
+                return await gather_lookups(required={
+                    "pr": fetch_pr(owner, repo, pr_number),
+                    "files": fetch_pr_files(
+                        owner, repo, pr_number, keep_patches=keep_patches
+                    ),
+                })
+            except GitHubAPIError as e:
+                return e
+
+    fetched = await asyncio.gather(*(fetch_one(*t) for t in targets))
+
+    results = [
+        {"pr_url": f"https://github.com/{owner}/{repo}/pull/{pr_number}"}
+        for owner, repo, pr_number in targets
+    ]
+    scored = [
+        (result, data)
+        for result, data in zip(results, fetched)
+        if not isinstance(data, GitHubAPIError)
+    ]
+    for result, data in zip(results, fetched):
+        if isinstance(data, GitHubAPIError):
+            result["error"] = data.message
+
+    ml_results = await predict_risk_batch(
+        [build_ml_input(data["pr"], data["files"]) for _, data in scored]
+    )
+
+    for (result, _), ml_result in zip(scored, ml_results):
+        result.update(ml_result)
+
+    if request.include_review:
+        review_slots = asyncio.Semaphore(settings.BATCH_REVIEW_CONCURRENCY)
+
+        async def review_one(data: Dict, ml_result: Dict) -> Dict:
+            async with review_slots:
+                return await generate_review(
+                    build_llm_context(data["pr"], data["files"], ml_result)
+                )
+
+        reviews = await asyncio.gather(*(
+            review_one(data, ml_result)
+            for (_, data), ml_result in zip(scored, ml_results)
+        ))
+        for (result, _), review in zip(scored, reviews):
+            result["review_comments"] = review
+
+    return {
+        "results": results,
+        "scored": len(scored),
+        "failed": len(results) - len(scored),
+    }
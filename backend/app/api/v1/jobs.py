@@ -0,0 +1,43 @@
+import logging
+
+from fastapi import APIRouter, Query
+
+from backend.app.schemas.request import AnalyzePRRequest
+from backend.app.schemas.response import JobStatusResponse, JobSubmittedResponse
+from backend.app.services import job_service
+
+router = APIRouter(prefix="/jobs")
+logger = logging.getLogger(__name__)
+
+MAX_WAIT_SECONDS = 60
+
+
+@router.post("/analyze", response_model=JobSubmittedResponse, status_code=202)
+async def submit_analyze_job(request: AnalyzePRRequest):
+    """
+    Queue a PR analysis and return immediately; poll the status URL for the
+    result
+    """
+    job = await job_service.submit("analyze_pr", {"pr_url": str(request.pr_url)})
+    logger.info(f"Analyze job {job['job_id']} queued for {request.pr_url}")
+
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/api/v1/jobs/{job['job_id']}",
+    }
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(
+        0,
+        ge=0,
+        le=MAX_WAIT_SECONDS,
+        description="Long-poll: wait up to this many seconds for the job to finish",
+    ),
+):
+    if wait:
+        return await job_service.wait(job_id, wait)
+    return await job_service.get(job_id)
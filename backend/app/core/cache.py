@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# a hit only moves a row's accessed_at (its LRU position) once it is older
+# than this, so reads don't turn into a write and a commit each
+ACCESS_UPDATE_INTERVAL = 60.0
+
+
+class MemoryCache:
+    """In-process LRU cache of bytes, bounded by total size and optional TTL."""
+
+    def __init__(self, max_bytes: int, ttl: float | None = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.time())
+            self._size += len(value)
+
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    async def aget(self, key: str) -> bytes | None:
+        return self.get(key)
+
+    async def aset(self, key: str, value: bytes) -> None:
+        self.set(key, value)
+
+    async def adelete(self, key: str) -> None:
+        self.delete(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+
+class SQLiteCache:
+    """
+    On-disk cache of bytes, evicting least recently used rows by size.
+
+    get/set/delete block on the database; async code uses aget/aset/adelete,
+    which run them on the cache's own worker thread.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int, ttl: float | None = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="sqlite-cache")
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)"
+        )
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()
+        self._size = row[0]
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at, accessed_at FROM cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, stored_at, accessed_at = row
+            if self.ttl is not None and now - stored_at > self.ttl:
+                self._remove(key)
+                self._conn.commit()
+                return None
+
+            if now - accessed_at > ACCESS_UPDATE_INTERVAL:
+                self._conn.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        now = time.time()
+
+        with self._lock:
+            self._remove(key)
+            self._conn.execute(
+                "INSERT INTO cache (key, value, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._size += len(value)
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+            self._conn.commit()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        with self._lock:
+            self._conn.close()
+
+    async def aget(self, key: str) -> bytes | None:
+        return await self._run(self.get, key)
+
+    async def aset(self, key: str, value: bytes) -> None:
+        await self._run(self.set, key, value)
+
+    async def adelete(self, key: str) -> None:
+        await self._run(self.delete, key)
+
+    def _run(self, fn, *args) -> asyncio.Future:
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _remove(self, key: str) -> None:
+        row = self._conn.execute(
+            "SELECT size FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._size -= row[0]
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM cache ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+
+            for key, size in rows:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._size -= size
+                if self._size <= self.max_bytes:
+                    break
+
+
+class TieredCache:
+    """Memory LRU in front of an optional disk tier. Disk hits are promoted."""
+
+    def __init__(self, memory: MemoryCache, disk: SQLiteCache | None = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> bytes | None:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+
+        try:
+            value = self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache read failed: {e}")
+            return None
+
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    async def aget(self, key: str) -> bytes | None:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+
+        try:
+            value = await self.disk.aget(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache read failed: {e}")
+            return None
+
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    async def aset(self, key: str, value: bytes) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                await self.disk.aset(key, value)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache write failed: {e}")
+
+    async def adelete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            await self.disk.adelete(key)
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
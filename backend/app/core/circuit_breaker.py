@@ -0,0 +1,138 @@
+import time
+from collections import deque
+
+from backend.app.core import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# gauge values, for /metrics
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while a dependency is known to be down.
+
+    Closed: calls go through; the outcomes of the last `window` calls are
+    kept, and the breaker opens once at least `min_calls` of them are
+    recorded and `error_rate` of those failed. A failure with an explicit
+    cool-down (e.g. a quota's retry delay) opens it at once.
+    Open: allow() is False until the cool-down has passed.
+    Half-open: one probe call is let through; its success closes the
+    breaker, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+    ):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._state = CLOSED
+        self._open_until = 0.0
+        self._probing = False
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.time() >= self._open_until:
+            return HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(self._open_until - time.time(), 0.0)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+
+        if state == HALF_OPEN and not self._probing:
+            self._state = HALF_OPEN
+            self._probing = True
+            self._publish()
+            return True
+
+        metrics.increment(f"{self.name}.breaker.rejected")
+        return False
+
+    def check(self) -> None:
+        """allow(), raising CircuitOpenError instead of returning False."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            self._outcomes.clear()
+            self._state = CLOSED
+            self._publish()
+        self._probing = False
+        self._outcomes.append(True)
+
+    def record_failure(self, cooldown: float | None = None) -> None:
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+
+        if (
+            cooldown is not None
+            or self._state == HALF_OPEN
+            or (
+                len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.error_rate
+            )
+        ):
+            self._open(max(cooldown or 0.0, self.cooldown))
+
+    def release(self) -> None:
+        """A let-through call ended without an outcome (e.g. cancelled)."""
+        self._probing = False
+
+    def _open(self, cooldown: float) -> None:
+        if self._state != OPEN:
+            metrics.increment(f"{self.name}.breaker.opened")
+        self._state = OPEN
+        self._open_until = max(self._open_until, time.time() + cooldown)
+        self._probing = False
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"{self.name}.breaker.state", _STATE_GAUGE[self._state])
+
+
+class RetryBudget:
+    """
+    Shared cap on retries: every first attempt deposits `ratio` of a retry
+    and every retry withdraws a whole one, so across all callers retries
+    stay under `ratio` of traffic once the initial `max_tokens` are spent.
+    """
+
+    def __init__(self, name: str, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.name = name
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def deposit(self) -> None:
+        self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        if self._tokens < 1:
+            metrics.increment(f"{self.name}.retry_budget.exhausted")
+            return False
+        self._tokens -= 1
+        return True
@@ -9,6 +9,101 @@ class Settings(BaseSettings):
     ENV: str = "development"
     LOG_LEVEL: str = "INFO"
 
+    # GitHub credentials pooled with GITHUB_TOKEN: more PATs (comma
+    # separated) and/or GitHub App installations (needs PyJWT). Requests wait
+    # up to GITHUB_RATE_LIMIT_MAX_WAIT seconds for a credential with headroom.
+    GITHUB_TOKENS: str = ""
+    GITHUB_APP_ID: str = ""
+    GITHUB_APP_PRIVATE_KEY_PATH: str = ""
+    GITHUB_APP_INSTALLATION_IDS: str = ""
+    GITHUB_RATE_LIMIT_RESERVE: int = 50
+    GITHUB_RATE_LIMIT_MAX_WAIT: float = 30.0
+
+    # GitHub HTTP client
+    GITHUB_MAX_CONNECTIONS: int = 20
+    GITHUB_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GITHUB_KEEPALIVE_EXPIRY: float = 30.0
+    GITHUB_CONNECT_TIMEOUT: float = 5.0
+    GITHUB_TIMEOUT: float = 10.0
+    GITHUB_HTTP2: bool = True
+
+    # GitHub conditional-request cache (empty path disables the disk tier)
+    GITHUB_CACHE_ENABLED: bool = True
+    GITHUB_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    GITHUB_CACHE_DB_PATH: str = ""
+    GITHUB_CACHE_DISK_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # ML model ("r" memory-maps an exported forest's flat .npy arrays so
+    # workers share them; the rf_model.joblib fallback is never shared)
+    MODEL_MMAP_MODE: str = "r"
+
+    # Model registry (empty path means ml/models/registry); the registry's
+    # CURRENT pointer is polled every MODEL_WATCH_INTERVAL seconds, 0 disables
+    MODEL_REGISTRY_DIR: str = ""
+    MODEL_WATCH_INTERVAL: float = 10.0
+
+    # Challenger model: a registry version scored next to the active one.
+    # "shadow" scores every request off the request path; "split" serves
+    # CHALLENGER_TRAFFIC_PERCENT of PRs with the challenger (and shadows the
+    # active model for those). Both scores go to SHADOW_LOG_PATH.
+    CHALLENGER_MODEL_VERSION: str = ""
+    CHALLENGER_MODE: str = "shadow"
+    CHALLENGER_TRAFFIC_PERCENT: float = 0.0
+    SHADOW_QUEUE_SIZE: int = 1000
+    SHADOW_LOG_PATH: str = str(BASE_DIR / ".cache" / "shadow_scores.jsonl")
+
+    # Background analysis jobs: "memory" or "sqlite" job store
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_SIZE: int = 100
+    JOB_TIMEOUT_SECONDS: float = 120.0
+    JOB_STORE_BACKEND: str = "memory"
+    JOB_STORE_PATH: str = str(BASE_DIR / ".cache" / "jobs.db")
+    JOB_STORE_MAX_BYTES: int = 64 * 1024 * 1024
+    JOB_RESULT_TTL_SECONDS: float = 60 * 60
+
+    # Admin endpoints are disabled while this is empty
+    ADMIN_TOKEN: str = ""
+
+    # Batch analysis
+    BATCH_MAX_PRS: int = 2000
+    BATCH_FETCH_CONCURRENCY: int = 16
+    BATCH_REVIEW_CONCURRENCY: int = 4
+
+    # LLM
+    LLM_MAX_CONCURRENCY: int = 4
+    # tokens of diff per prompt; 0 uses the model's default budget
+    LLM_DIFF_TOKEN_BUDGET: int = 0
+    # diffs over one budget are reviewed in up to LLM_MAX_SHARDS prompts (1
+    # disables sharding), LLM_SHARD_CONCURRENCY of them at a time per review
+    LLM_MAX_SHARDS: int = 8
+    LLM_SHARD_CONCURRENCY: int = 4
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    # the breaker opens when LLM_BREAKER_ERROR_RATE of the last
+    # LLM_BREAKER_WINDOW calls failed (once LLM_BREAKER_MIN_CALLS are in), or
+    # on a 429 for the quota's retry delay; requests get the fallback review
+    # until a probe call after the cool-down succeeds
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_WINDOW: int = 20
+    LLM_BREAKER_MIN_CALLS: int = 5
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    # retries across all reviews stay under this share of first attempts,
+    # after an initial LLM_RETRY_BUDGET_MAX
+    LLM_RETRY_BUDGET_RATIO: float = 0.2
+    LLM_RETRY_BUDGET_MAX: int = 10
+
+    # LLM review cache: "memory", "sqlite" or "none"
+    LLM_CACHE_BACKEND: str = "memory"
+    LLM_CACHE_TTL_SECONDS: float = 24 * 60 * 60
+    LLM_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    LLM_CACHE_PATH: str = str(BASE_DIR / ".cache" / "llm_reviews.db")
+
+    # Stored analyses and per-file reviews for incremental re-analysis:
+    # "memory", "sqlite" or "none"
+    ANALYSIS_STORE_BACKEND: str = "memory"
+    ANALYSIS_STORE_TTL_SECONDS: float = 14 * 24 * 60 * 60
+    ANALYSIS_STORE_MAX_BYTES: int = 64 * 1024 * 1024
+    ANALYSIS_STORE_PATH: str = str(BASE_DIR / ".cache" / "analyses.db")
+
     model_config = SettingsConfigDict(
         env_file=BASE_DIR / ".env",
         env_file_encoding="utf-8",
@@ -20,6 +20,26 @@ class MLServiceError(ApplicationError):
         super().__init__(message, "ML_SERVICE_ERROR")
 
 
+class ModelReloadError(ApplicationError):
+    def __init__(self, message="Model reload failed"):
+        super().__init__(message, "MODEL_RELOAD_FAILED")
+
+
+class AdminAuthError(ApplicationError):
+    def __init__(self, message="Admin token missing or invalid"):
+        super().__init__(message, "ADMIN_AUTH_FAILED")
+
+
+class JobNotFoundError(ApplicationError):
+    def __init__(self, message="Job not found"):
+        super().__init__(message, "JOB_NOT_FOUND")
+
+
+class QueueFullError(ApplicationError):
+    def __init__(self, message="Too many queued jobs, try again shortly"):
+        super().__init__(message, "QUEUE_FULL")
+
+
 class LLMServiceError(ApplicationError):
     def __init__(self, message="LLM Service Error"):
         super().__init__(message, "LLM_SERVICE_ERROR")
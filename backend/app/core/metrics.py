@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters: dict[str, float] = defaultdict(float)
+_gauges: dict[str, float] = defaultdict(float)
+_timings: dict[str, dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1.0) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def adjust_gauge(name: str, delta: float) -> None:
+    with _lock:
+        _gauges[name] += delta
+
+
+def observe(name: str, seconds: float) -> None:
+    with _lock:
+        timing = _timings.setdefault(
+            name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        timing["count"] += 1
+        timing["total_seconds"] += seconds
+        timing["max_seconds"] = max(timing["max_seconds"], seconds)
+
+
+@contextmanager
+def timer(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot() -> dict:
+    with _lock:
+        timings = {
+            name: {
+                **timing,
+                "avg_seconds": (
+                    timing["total_seconds"] / timing["count"]
+                    if timing["count"] else 0.0
+                ),
+            }
+            for name, timing in _timings.items()
+        }
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": timings,
+        }
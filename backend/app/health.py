@@ -1,8 +1,33 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from backend.app.core import metrics
+from backend.app.services.ml_service import readiness
 
 router = APIRouter()
 
 
 @router.get("/health")
 def health():
-    return {"status": "OK it is working"}
\ No newline at end of file
+    return {"status": "OK it is working"}
+
+
+@router.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+def ready():
+    checks = readiness()
+    is_ready = checks["model_loaded"]
+
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"status": "ready" if is_ready else "not_ready", **checks},
+    )
+
+
+@router.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
\ No newline at end of file
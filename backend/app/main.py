@@ -1,15 +1,31 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
-from backend.app.api.v1.analyze import router as analyze_router
+from backend.app.api.v1.admin import router as admin_router
+from backend.app.api.v1.analyze import analyze_pr_job, router as analyze_router
+from backend.app.api.v1.jobs import router as jobs_router
 from backend.app.health import router as health_router
+from backend.app.services import (
+    analysis_store,
+    github_service,
+    job_service,
+    ml_service,
+)
+from backend.app.core.config import settings
 from backend.app.core.exceptions import (
+    AdminAuthError,
     ApplicationError,
     GitHubAPIError,
     InvalidPullRequestURLError,
+    JobNotFoundError,
     MLServiceError,
+    ModelReloadError,
+    QueueFullError,
 )
 
 logging.basicConfig(
@@ -17,7 +33,34 @@ logging.basicConfig(
     format="%(levelname)s:%(name)s:%(message)s",
 )
 
-app = FastAPI(title="GitHub PR Risk Analyzer")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await github_service.init_client()
+    await ml_service.load_model()
+    await ml_service.start_challenger()
+    await job_service.start({"analyze_pr": analyze_pr_job})
+
+    watcher = None
+    if settings.MODEL_WATCH_INTERVAL > 0:
+        watcher = asyncio.create_task(
+            ml_service.watch_registry(settings.MODEL_WATCH_INTERVAL)
+        )
+
+    try:
+        yield
+    finally:
+        if watcher:
+            watcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await watcher
+        await job_service.stop()
+        await ml_service.stop_challenger()
+        await github_service.close_client()
+        analysis_store.close_store()
+
+
+app = FastAPI(title="GitHub PR Risk Analyzer", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -61,6 +104,39 @@ async def ml_service_handler(request: Request, exc: MLServiceError):
     )
 
 
+@app.exception_handler(JobNotFoundError)
+async def job_not_found_handler(request: Request, exc: JobNotFoundError):
+    return JSONResponse(
+        status_code=404,
+        content={"message": exc.message},
+    )
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    return JSONResponse(
+        status_code=503,
+        content={"message": exc.message},
+        headers={"Retry-After": "5"},
+    )
+
+
+@app.exception_handler(ModelReloadError)
+async def model_reload_handler(request: Request, exc: ModelReloadError):
+    return JSONResponse(
+        status_code=409,
+        content={"message": exc.message},
+    )
+
+
+@app.exception_handler(AdminAuthError)
+async def admin_auth_handler(request: Request, exc: AdminAuthError):
+    return JSONResponse(
+        status_code=403,
+        content={"message": exc.message},
+    )
+
+
 @app.exception_handler(ApplicationError)
 async def application_error_handler(request: Request, exc: ApplicationError):
     return JSONResponse(
@@ -71,3 +147,5 @@ async def application_error_handler(request: Request, exc: ApplicationError):
 
 app.include_router(health_router)
 app.include_router(analyze_router, prefix="/api/v1")
+app.include_router(jobs_router, prefix="/api/v1")
+app.include_router(admin_router, prefix="/api/v1")
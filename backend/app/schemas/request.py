@@ -1,5 +1,10 @@
 import re
-from pydantic import BaseModel, HttpUrl, Field, field_validator
+from typing import List, Optional
+
+from pydantic import BaseModel, HttpUrl, Field, field_validator, model_validator
+
+PR_URL_PATTERN = r"^https://github\.com/[^/]+/[^/]+/pull/\d+$"
+REPO_PATTERN = r"^[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+$"
 
 class AnalyzePRRequest(BaseModel):
     pr_url: HttpUrl = Field(
@@ -11,7 +16,49 @@ class AnalyzePRRequest(BaseModel):
     @field_validator("pr_url")
     @classmethod
     def validate_pr_url(cls, value: HttpUrl) -> HttpUrl:
-        pattern = r"^https://github\.com/[^/]+/[^/]+/pull/\d+$"
-        if not re.match(pattern, str(value)):
+        if not re.match(PR_URL_PATTERN, str(value)):
             raise ValueError("Invalid GitHub PR URL format")
-        return value
\ No newline at end of file
+        return value
+
+class AnalyzeBatchRequest(BaseModel):
+    pr_urls: List[HttpUrl] = Field(
+        default_factory = list,
+        description = "GitHub Pull Request URLs to score",
+    )
+    repo: Optional[str] = Field(
+        None,
+        description = "Score every open PR of this repository (owner/repo)",
+        examples = ["facebook/react"]
+    )
+    include_review: bool = Field(
+        False,
+        description = "Also generate an LLM review for every PR (slow)",
+    )
+
+    @field_validator("pr_urls")
+    @classmethod
+    def validate_pr_urls(cls, value: List[HttpUrl]) -> List[HttpUrl]:
+        for url in value:
+            if not re.match(PR_URL_PATTERN, str(url)):
+                raise ValueError(f"Invalid GitHub PR URL format: {url}")
+        return value
+
+    @field_validator("repo")
+    @classmethod
+    def validate_repo(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and not re.match(REPO_PATTERN, value):
+            raise ValueError("Invalid repository format, expected owner/repo")
+        return value
+
+    @model_validator(mode="after")
+    def require_targets(self) -> "AnalyzeBatchRequest":
+        if not self.pr_urls and not self.repo:
+            raise ValueError("Provide pr_urls, repo or both")
+        return self
+
+class ModelReloadRequest(BaseModel):
+    version: Optional[str] = Field(
+        None,
+        description = "Version to activate; defaults to the registry's current version",
+        examples = ["20261018T120000Z"]
+    )
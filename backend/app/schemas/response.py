@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -18,10 +18,53 @@ class LLMReview(BaseModel):
     mitigation_steps: List[str]
     file_reviews: List[FileReview]
     source: Optional[str] = None
+    cached: bool = False
 
 
 class AnalyzePRResponse(BaseModel):
     risk_label: str = Field(..., examples=["LOW", "MEDIUM", "HIGH"])
     risk_score: float = Field(..., ge=0.0, le=10.0)
     review_comments: LLMReview
-    ai_unavailable: bool = False
\ No newline at end of file
+    ai_unavailable: bool = False
+    model_version: Optional[str] = None
+
+
+class BatchPRResult(BaseModel):
+    pr_url: str
+    risk_label: Optional[str] = Field(None, examples=["LOW", "MEDIUM", "HIGH"])
+    risk_score: Optional[float] = Field(None, ge=0.0, le=10.0)
+    top_risk_factors: List[str] = []
+    review_comments: Optional[LLMReview] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+
+
+class AnalyzeBatchResponse(BaseModel):
+    results: List[BatchPRResult]
+    scored: int
+    failed: int
+
+
+class JobSubmittedResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., examples=["queued"])
+    status_url: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str = Field(..., examples=["queued", "running", "succeeded", "failed"])
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stages: Dict[str, float] = {}
+    result: Optional[AnalyzePRResponse] = None
+    error: Optional[str] = None
+
+
+class ModelInfoResponse(BaseModel):
+    version: Optional[str] = None
+    manifest: dict = {}
+    available: List[str] = []
+    challenger: Optional[str] = None
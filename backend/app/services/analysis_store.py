@@ -0,0 +1,156 @@
+"""
+Stored analyses for incremental re-analysis.
+
+Three kinds of entries share one cache:
+
+    file:<hash>                     one file's review {"file", "issues"}
+    analysis:<owner>/<repo>#<n>@<sha>  the analysis of one head commit
+    latest:<owner>/<repo>#<n>       head SHA of the PR's last analysis
+
+A file review is keyed by the review model, the file name and the patch (or
+the blob SHA when GitHub sent no patch), so an unchanged file is reused on
+the next push and an identical patch is reused across PRs (cherry-picks,
+backports). The analysis record maps each file name to the key of its
+review, which lets files the compare API reports as untouched keep their
+review even when their patch text shifted with the base branch.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Dict, Iterable, List
+
+from backend.app.core import metrics
+from backend.app.core.cache import MemoryCache, SQLiteCache
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_store: MemoryCache | SQLiteCache | None = None
+_configured = False
+
+
+def _default_store() -> MemoryCache | SQLiteCache | None:
+    kind = settings.ANALYSIS_STORE_BACKEND.lower()
+    ttl = settings.ANALYSIS_STORE_TTL_SECONDS
+
+    if kind == "memory":
+        return MemoryCache(settings.ANALYSIS_STORE_MAX_BYTES, ttl)
+    if kind == "sqlite":
+        return SQLiteCache(
+            settings.ANALYSIS_STORE_PATH, settings.ANALYSIS_STORE_MAX_BYTES, ttl
+        )
+    if kind != "none":
+        logger.warning(f"Unknown ANALYSIS_STORE_BACKEND '{kind}', store disabled")
+    return None
+
+
+def get_store() -> MemoryCache | SQLiteCache | None:
+    global _store, _configured
+
+    if not _configured:
+        _store = _default_store()
+        _configured = True
+    return _store
+
+
+def close_store() -> None:
+    global _store, _configured
+
+    if isinstance(_store, SQLiteCache):
+        _store.close()
+    _store = None
+    _configured = False
+
+
+async def _get(key: str) -> Dict | None:
+    store = get_store()
+    raw = await store.aget(key) if store is not None else None
+    return json.loads(raw) if raw is not None else None
+
+
+async def _set(key: str, value: Dict | str) -> None:
+    store = get_store()
+    if store is not None:
+        await store.aset(key, json.dumps(value).encode("utf-8"))
+
+
+def _pr_id(pr_key: tuple) -> str:
+    owner, repo, pr_number = pr_key
+    return f"{owner}/{repo}#{pr_number}"
+
+
+def file_key(file: Dict, model: str) -> str:
+    patch = file.get("patch")
+    content = f"patch:{patch}" if patch is not None else f"blob:{file.get('sha')}"
+    payload = f"{model}\0{file.get('filename')}\0{content}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_file_review(key: str | None) -> Dict | None:
+    if key is None:
+        return None
+    return await _get(f"file:{key}")
+
+
+async def store_file_review(key: str, review: Dict) -> None:
+    await _set(f"file:{key}", {"file": review["file"], "issues": review["issues"]})
+
+
+async def latest(pr_key: tuple) -> Dict | None:
+    """
+    The PR's most recent stored analysis, or None
+    """
+    head_sha = await _get(f"latest:{_pr_id(pr_key)}")
+    if head_sha is None:
+        return None
+    return await _get(f"analysis:{_pr_id(pr_key)}@{head_sha}")
+
+
+async def store_analysis(pr_key: tuple, head_sha: str, analysis: Dict) -> None:
+    await _set(f"analysis:{_pr_id(pr_key)}@{head_sha}", {**analysis, "head_sha": head_sha})
+    await _set(f"latest:{_pr_id(pr_key)}", head_sha)
+
+
+async def plan(
+    files: List[Dict],
+    model: str,
+    previous: Dict | None,
+    unchanged: Iterable[str] = (),
+) -> tuple[Dict[str, Dict], List[Dict], Dict[str, str]]:
+    """
+    Split files into (reused reviews by file name, files to review, file
+    keys by name). A file listed in unchanged keeps its review from the
+    previous analysis; any other file reuses a review of the same patch.
+    Files without a patch (past the fetch's patch limit, or binary) are
+    neither: the model never sees them, so they would otherwise stay
+    pending on every analysis.
+    """
+    unchanged = set(unchanged)
+    previous_files = (previous or {}).get("files", {})
+
+    reused, pending, keys = {}, [], {}
+    skipped = 0
+    for file in files:
+        name = file.get("filename")
+        keys[name] = file_key(file, model)
+
+        review = None
+        if name in unchanged:
+            review = await get_file_review(previous_files.get(name))
+            if review is not None:
+                keys[name] = previous_files[name]
+        if review is None:
+            review = await get_file_review(keys[name])
+
+        if review is not None:
+            reused[name] = review
+        elif file.get("patch") is not None:
+            pending.append(file)
+        else:
+            skipped += 1
+
+    metrics.increment("analysis.files.reused", len(reused))
+    metrics.increment("analysis.files.reviewed", len(pending))
+    metrics.increment("analysis.files.skipped", skipped)
+    return reused, pending, keys
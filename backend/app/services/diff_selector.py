@@ -1,68 +1,289 @@
-from typing import List, Dict
+"""
+Token-budgeted diff packing for the LLM prompt.
 
-MAX_FILES = 5
-MAX_LINES_PER_FILE = 300
-MAX_TOTAL_CHARS = 15000
+Each file's patch is split into hunks; inside a hunk every changed line opens
+a +/- CONTEXT_LINES window and overlapping windows are merged into one
+segment, so no line is sent twice. Segments are scored by their changed
+lines, the file type and the model's top risk factors, then packed greedily
+by score per token into the model's token budget. The result lists files by
+relevance, segments in line order.
 
+When the diff does not fit one budget, build_patch_shards spreads it over
+several prompts of one budget each instead, for sharded reviews.
+"""
+
+import math
+import re
+from typing import Dict, Iterable, List
+
+# files whose patches are kept when fetching (largest churn first)
+MAX_PATCH_FILES = 20
+CONTEXT_LINES = 2
+# merged windows are split at this length so dense hunks still fit a budget
+MAX_SEGMENT_LINES = 30
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 4000
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+# (pattern on the path, weight); first match wins, default 1.0
+FILE_WEIGHTS = [
+    (re.compile(r"(^|/)(package-lock\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|pdm\.lock|Cargo\.lock|go\.sum)$"), 0.05),
+    (re.compile(r"\.(min\.js|map|svg|png|jpg|gif|ico|pdf|lock)$"), 0.05),
+    (re.compile(r"(^|/)(docs?/|CHANGELOG|README)|\.(md|rst|txt)$", re.IGNORECASE), 0.3),
+    (re.compile(r"(^|/)(tests?/|__tests__/)|(_test|\.test|\.spec|test_)[^/]*$"), 0.6),
+    (re.compile(r"\.(ya?ml|json|toml|ini|cfg)$"), 0.7),
+]
+
+# changed lines touching these are worth more to a security review
+SENSITIVE = re.compile(
+    r"password|secret|token|api[_-]?key|auth|permission|crypt|eval\(|exec\(|"
+    r"subprocess|shell=True|sql|query\(|deserializ|pickle|unsafe",
+    re.IGNORECASE,
+)
+SENSITIVE_BOOST = 1.5
+
+# ML risk factors that shift weight between added and deleted lines
+ADDITION_FACTORS = {"additions", "total_changes", "change_ratio", "avg_changes_per_file"}
+DELETION_FACTORS = {"deletions"}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def file_weight(filename: str) -> float:
+    for pattern, weight in FILE_WEIGHTS:
+        if pattern.search(filename or ""):
+            return weight
+    return 1.0
 
-def _extract_relevant_lines(patch: str, include_deletions: bool) -> List[str]:
-    if not patch:
-        return []
 
-    lines = patch.splitlines()
-    selected = []
+def _split_hunks(patch: str) -> List[Dict]:
+    hunks = []
+    for line in patch.splitlines():
+        match = HUNK_HEADER.match(line)
+        if match:
+            hunks.append({"old": int(match[1]), "new": int(match[2]), "lines": []})
+        elif hunks:
+            hunks[-1]["lines"].append(line)
+        else:
+            # patch without a header: treat it as one hunk
+            hunks.append({"old": 1, "new": 1, "lines": [line]})
+    return hunks
 
+
+def _windows(lines: List[str], include_deletions: bool) -> List[tuple]:
+    """Merged [start, end) windows around the changed lines of one hunk."""
+    merged = []
     for i, line in enumerate(lines):
-        if line.startswith("+") and not line.startswith("+++"):
-            # include 2 lines before and after for context
-            start = max(i - 2, 0)
-            end = min(i + 3, len(lines))
-            selected.extend(lines[start:end])
+        if line.startswith("+") or (include_deletions and line.startswith("-")):
+            start = max(i - CONTEXT_LINES, 0)
+            end = min(i + CONTEXT_LINES + 1, len(lines))
+            if merged and start <= merged[-1][1]:
+                if end - merged[-1][0] <= MAX_SEGMENT_LINES:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                    continue
+                start = merged[-1][1]
+            if end > start:
+                merged.append((start, end))
+    return merged
+
+
+def _line_numbers(hunk: Dict, start: int) -> tuple:
+    old, new = hunk["old"], hunk["new"]
+    for line in hunk["lines"][:start]:
+        if not line.startswith("+"):
+            old += 1
+        if not line.startswith("-"):
+            new += 1
+    return old, new
+
+
+def _segments(file: Dict, include_deletions: bool, factors: set) -> List[Dict]:
+    filename = file.get("filename") or ""
+    weight = file_weight(filename)
+    add_weight = 1.25 if factors & ADDITION_FACTORS else 1.0
+    del_weight = (1.0 if factors & DELETION_FACTORS else 0.5) if include_deletions else 0.0
+
+    segments = []
+    for hunk_index, hunk in enumerate(_split_hunks(file.get("patch") or "")):
+        for start, end in _windows(hunk["lines"], include_deletions):
+            lines = hunk["lines"][start:end]
+            old, new = _line_numbers(hunk, start)
+            text = f"@@ -{old} +{new} @@\n" + "\n".join(lines)
+
+            score = 0.0
+            for line in lines:
+                if line.startswith("+"):
+                    line_score = add_weight
+                elif line.startswith("-"):
+                    line_score = del_weight
+                else:
+                    continue
+                if SENSITIVE.search(line):
+                    line_score *= SENSITIVE_BOOST
+                score += line_score
+
+            if score > 0:
+                segments.append({
+                    "file": filename,
+                    "order": (hunk_index, start),
+                    "text": text,
+                    "tokens": estimate_tokens(text) + 1,
+                    "score": score * weight,
+                })
+    return segments
+
+
+def _file_header(filename: str) -> str:
+    return f"File: {filename}"
 
-        if include_deletions and line.startswith("-") and not line.startswith("---"):
-            selected.append(line)
 
-    return selected
+def packed_files(selected_patch: str) -> set:
+    """
+    Names of the files that have at least one segment in a packed diff
+    """
+    return {
+        line[len("File: "):]
+        for line in selected_patch.splitlines()
+        if line.startswith("File: ")
+    }
+
+
+def pack_segments(segments: List[Dict], token_budget: int) -> List[Dict]:
+    """
+    Greedy 0/1 knapsack by score per token. A file's header is charged to its
+    first chosen segment. The best single segment is kept instead when it
+    alone beats the greedy fill (the usual 1/2-approximation guard).
+    """
+    def cost(segment: Dict, opened: set) -> int:
+        header = 0 if segment["file"] in opened else estimate_tokens(_file_header(segment["file"])) + 2
+        return segment["tokens"] + header
+
+    ranked = sorted(
+        segments,
+        key=lambda s: s["score"] / (s["tokens"] + estimate_tokens(_file_header(s["file"]))),
+        reverse=True,
+    )
+
+    chosen, opened, used = [], set(), 0
+    for segment in ranked:
+        needed = cost(segment, opened)
+        if used + needed <= token_budget:
+            chosen.append(segment)
+            opened.add(segment["file"])
+            used += needed
+
+    fitting = [s for s in segments if cost(s, set()) <= token_budget]
+    if fitting:
+        best = max(fitting, key=lambda s: s["score"])
+        if best["score"] > sum(s["score"] for s in chosen):
+            return [best]
+
+    return chosen
+
+
+def _render(chosen: List[Dict]) -> str:
+    by_file: Dict[str, List[Dict]] = {}
+    for segment in chosen:
+        by_file.setdefault(segment["file"], []).append(segment)
+
+    # most relevant files first, hunks in file order
+    sections = []
+    for filename, file_segments in sorted(
+        by_file.items(), key=lambda item: -sum(s["score"] for s in item[1])
+    ):
+        file_segments.sort(key=lambda s: s["order"])
+        sections.append(
+            _file_header(filename) + "\n" + "\n".join(s["text"] for s in file_segments)
+        )
+
+    return "\n\n".join(sections)
 
 
 def build_selected_patch(
-    files_data: List[Dict],
-    risk_score: float
+    files_data: Iterable[Dict],
+    risk_score: float,
+    top_risk_factors: Iterable[str] | None = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
 ) -> str:
 
     if risk_score <= 3:
         return ""
 
     include_deletions = risk_score >= 7
+    factors = set(top_risk_factors or [])
 
-    sorted_files = sorted(
-        files_data,
-        key=lambda f: f.get("additions", 0) + f.get("deletions", 0),
-        reverse=True
-    )
+    segments = [
+        segment
+        for file in files_data
+        for segment in _segments(file, include_deletions, factors)
+    ]
+    return _render(pack_segments(segments, token_budget))
 
-    selected_files = sorted_files[:MAX_FILES]
 
-    sections = []
-    total_chars = 0
+def build_patch_shards(
+    files_data: Iterable[Dict],
+    risk_score: float,
+    top_risk_factors: Iterable[str] | None = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_shards: int = 8,
+) -> List[Dict]:
+    """
+    Split the diff into at most max_shards prompts of token_budget each, as
+    [{"file_names", "selected_patch"}]. Files go in by score, most relevant
+    first, into the first shard with room; a file bigger than one shard gets
+    its own, packed to the budget. Files with nothing to show are listed in
+    the first shard. Returns [] when the whole diff fits in one prompt.
+    """
+    if risk_score <= 3:
+        return []
 
-    for file in selected_files:
-        filename = file.get("filename")
-        patch = file.get("patch", "")
+    include_deletions = risk_score >= 7
+    factors = set(top_risk_factors or [])
 
-        relevant_lines = _extract_relevant_lines(patch, include_deletions)
+    per_file, names_only = [], []
+    for file in files_data:
+        segments = _segments(file, include_deletions, factors)
+        if segments:
+            per_file.append(segments)
+        else:
+            names_only.append(file.get("filename"))
 
-        if not relevant_lines:
-            continue
+    per_file.sort(key=lambda segments: -sum(s["score"] for s in segments))
 
-        relevant_lines = relevant_lines[:MAX_LINES_PER_FILE]
+    shards = []
+    for segments in per_file:
+        segments = pack_segments(segments, token_budget)
+        if not segments:
+            continue
+        cost = (
+            sum(s["tokens"] for s in segments)
+            + estimate_tokens(_file_header(segments[0]["file"])) + 2
+        )
 
-        section = f"\nFile: {filename}\n" + "\n".join(relevant_lines)
+        for shard in shards:
+            if shard["tokens"] + cost <= token_budget:
+                break
+        else:
+            if len(shards) == max_shards:
+                continue
+            shard = {"segments": [], "tokens": 0}
+            shards.append(shard)
 
-        if total_chars + len(section) > MAX_TOTAL_CHARS:
-            break
+        shard["segments"].extend(segments)
+        shard["tokens"] += cost
 
-        sections.append(section)
-        total_chars += len(section)
+    if len(shards) <= 1:
+        return []
 
-    return "\n\n".join(sections)
\ No newline at end of file
+    result = [
+        {
+            "file_names": list(dict.fromkeys(s["file"] for s in shard["segments"])),
+            "selected_patch": _render(shard["segments"]),
+        }
+        for shard in shards
+    ]
+    result[0]["file_names"] += names_only
+    return result
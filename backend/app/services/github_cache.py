@@ -0,0 +1,119 @@
+import json
+import logging
+
+import httpx
+
+from backend.app.core.cache import MemoryCache, SQLiteCache, TieredCache
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_cache: TieredCache | None = None
+
+
+def get_cache() -> TieredCache | None:
+    """Return the process-wide response cache, or None when disabled."""
+    global _cache
+
+    if not settings.GITHUB_CACHE_ENABLED:
+        return None
+
+    if _cache is None:
+        disk = None
+        if settings.GITHUB_CACHE_DB_PATH:
+            disk = SQLiteCache(
+                settings.GITHUB_CACHE_DB_PATH,
+                max_bytes=settings.GITHUB_CACHE_DISK_MAX_BYTES,
+            )
+        _cache = TieredCache(
+            MemoryCache(max_bytes=settings.GITHUB_CACHE_MAX_BYTES),
+            disk,
+        )
+
+    return _cache
+
+
+def close_cache() -> None:
+    global _cache
+
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def cache_key(url: str, params: dict | None, headers: dict) -> str:
+    full_url = httpx.URL(url, params=params)
+    return f"{headers.get('Accept', '')} {full_url}"
+
+
+def _encode(response: httpx.Response) -> bytes:
+    meta = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "link": response.headers.get("Link"),
+        "content_type": response.headers.get("Content-Type"),
+    }
+    return json.dumps(meta).encode("utf-8") + b"\n" + response.content
+
+
+def _decode(value: bytes) -> tuple[dict, bytes]:
+    meta, _, body = value.partition(b"\n")
+    return json.loads(meta), body
+
+
+async def lookup(key: str) -> tuple[dict, bytes] | None:
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    value = await cache.aget(key)
+    return _decode(value) if value is not None else None
+
+
+def conditional_headers(entry: tuple[dict, bytes] | None) -> dict:
+    if entry is None:
+        return {}
+
+    meta, _ = entry
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+async def store(key: str, response: httpx.Response) -> None:
+    cache = get_cache()
+    if cache is None:
+        return
+
+    # only validators make an entry useful for conditional requests
+    if not (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+        return
+
+    await cache.aset(key, _encode(response))
+
+
+def replay(entry: tuple[dict, bytes], not_modified: httpx.Response) -> httpx.Response:
+    """Build a 200 response from a cached body after a 304."""
+    meta, body = entry
+    headers = {
+        name: value
+        for name, value in (
+            ("Content-Type", meta.get("content_type")),
+            ("ETag", meta.get("etag")),
+            ("Last-Modified", meta.get("last_modified")),
+            ("Link", meta.get("link")),
+        )
+        if value
+    }
+
+    logger.debug(f"GitHub cache hit (304): {not_modified.request.url}")
+
+    return httpx.Response(
+        200,
+        headers=headers,
+        content=body,
+        request=not_modified.request,
+    )
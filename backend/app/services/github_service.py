@@ -1,37 +1,203 @@
+import asyncio
 import base64
+import heapq
+import importlib.util
+import logging
+from collections import deque
+from contextlib import aclosing
+from typing import Any, Awaitable
+
 import httpx
+from backend.app.core import metrics
 from backend.app.core.config import settings
 from backend.app.core.exceptions import GitHubAPIError
+from backend.app.services import github_cache
+from ml.data.token_pool import (
+    RateLimitExhausted,
+    TokenPool,
+    TokenPoolError,
+    is_rate_limited,
+    pool_from_config,
+)
+
+logger = logging.getLogger(__name__)
 
 BASE_URL = "https://api.github.com"
+PER_PAGE = 100
+PAGE_PREFETCH = 4
+MAX_PR_FILES = 3000
+
+_client: httpx.AsyncClient | None = None
+_pool: TokenPool | None = None
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional "h2" package is installed
+    return importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.GITHUB_HTTP2 and _http2_available()
+
+    limits = httpx.Limits(
+        max_connections=settings.GITHUB_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GITHUB_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.GITHUB_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        settings.GITHUB_TIMEOUT,
+        connect=settings.GITHUB_CONNECT_TIMEOUT,
+    )
+
+    logger.info(f"Creating GitHub client (http2={http2})")
+
+    return httpx.AsyncClient(
+        base_url=BASE_URL,
+        http2=http2,
+        limits=limits,
+        timeout=timeout,
+    )
+
+
+async def init_client() -> None:
+    """Create the process-wide GitHub client. Called on app startup."""
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+
+async def close_client() -> None:
+    """Close the shared client and its pooled connections. Called on shutdown."""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+    github_cache.close_cache()
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared client. Falls back to creating it lazily so scripts
+    and tests that bypass the app lifespan still work.
+    """
+    global _client
 
+    if _client is None or _client.is_closed:
+        _client = _build_client()
 
-def _headers():
-    if not settings.GITHUB_TOKEN:
-        raise GitHubAPIError("GITHUB_TOKEN not set")
+    return _client
 
-    return {
-        "Authorization": f"Bearer {settings.GITHUB_TOKEN}",
-        "Accept": "application/vnd.github+json",
-    }
 
+def get_pool() -> TokenPool:
+    """Return the process-wide credential pool, built from settings."""
+    global _pool
 
-async def _get(url: str):
-    """Reusable GET helper with clean error mapping"""
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(url, headers=_headers())
+    if _pool is None:
+        try:
+            _pool = pool_from_config(
+                settings.GITHUB_TOKEN,
+                settings.GITHUB_TOKENS,
+                settings.GITHUB_APP_ID,
+                settings.GITHUB_APP_PRIVATE_KEY_PATH,
+                settings.GITHUB_APP_INSTALLATION_IDS,
+                settings.GITHUB_RATE_LIMIT_RESERVE,
+            )
+        except TokenPoolError:
+            raise GitHubAPIError("GITHUB_TOKEN not set")
+
+    return _pool
+
+
+async def _send(
+    url: str,
+    params: dict | None,
+    headers: dict,
+    timeout: float | None,
+) -> httpx.Response:
+    """
+    GET with a pooled credential. A rate-limited response marks its
+    credential and the request moves on to the next one with headroom.
+    """
+    pool = get_pool()
+
+    for _ in range(len(pool) + 1):
+        try:
+            credential = await pool.acquire(
+                max_wait=settings.GITHUB_RATE_LIMIT_MAX_WAIT
+            )
+            auth = await pool.auth_headers(credential, get_client())
+        except RateLimitExhausted:
+            metrics.increment("github.rate_limited")
+            raise GitHubAPIError(
+                "GitHub rate limit reached. Please try again later."
+            )
+        except TokenPoolError as e:
+            logger.error(f"GitHub credential unavailable: {e}")
+            raise GitHubAPIError("Unable to authenticate with GitHub.")
+
+        response = None
+        try:
+            response = await get_client().get(
+                url,
+                params=params,
+                headers={**headers, **auth},
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+        finally:
+            pool.release(credential, response)
+
+        if not is_rate_limited(response):
+            return response
+
+        metrics.increment("github.rate_limit_retries")
+        logger.warning(f"GitHub rate limit hit on {credential.name}, rerouting")
+
+    return response
+
+
+async def _request(
+    url: str,
+    params: dict | None = None,
+    timeout: float | None = None,
+) -> httpx.Response:
+    """
+    Reusable GET helper with clean error mapping.
+
+    Responses carrying an ETag or Last-Modified are cached and revalidated
+    with conditional requests; a 304 is served from the cache and does not
+    count against the GitHub rate limit.
+    """
+    headers = {"Accept": "application/vnd.github+json"}
+    key = github_cache.cache_key(url, params, headers)
+    cached = await github_cache.lookup(key)
+    headers.update(github_cache.conditional_headers(cached))
+
+    try:
+        response = await _send(url, params, headers, timeout)
+    except httpx.TimeoutException:
+        raise GitHubAPIError("GitHub took too long to respond. Please try again.")
+    except httpx.HTTPError:
+        raise GitHubAPIError("Unable to reach GitHub. Please try again.")
 
     # SUCCESS
     if response.status_code == 200:
-        return response.json()
+        await github_cache.store(key, response)
+        return response
+
+    # NOT MODIFIED
+    if response.status_code == 304 and cached is not None:
+        return github_cache.replay(cached, response)
 
     # NOT FOUND
     if response.status_code == 404:
         raise GitHubAPIError("Pull request not found.")
 
     # FORBIDDEN
-    if response.status_code == 403:
-        if "rate limit" in response.text.lower():
+    if response.status_code in (403, 429):
+        if is_rate_limited(response) or "rate limit" in response.text.lower():
             raise GitHubAPIError(
                 "GitHub rate limit reached. Please try again later."
             )
@@ -45,14 +211,162 @@ async def _get(url: str):
     )
 
 
+async def _get(
+    url: str,
+    params: dict | None = None,
+    timeout: float | None = None,
+):
+    response = await _request(url, params=params, timeout=timeout)
+    return response.json()
+
+
+def _page_number(url: str | None) -> int | None:
+    if not url:
+        return None
+    page = httpx.URL(url).params.get("page")
+    return int(page) if page and page.isdigit() else None
+
+
+def _discard(tasks) -> None:
+    for task in tasks:
+        if task.done():
+            if not task.cancelled():
+                # mark the exception as retrieved
+                task.exception()
+        else:
+            task.cancel()
+
+
+async def _iter_pages(
+    url: str,
+    total_items: int | None = None,
+    params: dict | None = None,
+):
+    """
+    Yield every page of a paginated GitHub listing.
+
+    Once the page count is known (from the Link "last" relation or from
+    total_items) the remaining pages are fetched concurrently, a few at a
+    time, and yielded in order. Otherwise Link "next" is followed serially.
+    """
+    params = {**(params or {}), "per_page": PER_PAGE, "page": 1}
+    response = await _request(url, params=params)
+    yield response.json()
+
+    links = response.links
+    if "next" not in links:
+        return
+
+    last_page = _page_number(links.get("last", {}).get("url"))
+    if last_page is None and total_items is not None:
+        last_page = -(-total_items // PER_PAGE)
+
+    if last_page is None:
+        next_url = links["next"]["url"]
+        while next_url:
+            response = await _request(next_url)
+            yield response.json()
+            next_url = response.links.get("next", {}).get("url")
+        return
+
+    pending = deque()
+    page = 2
+
+    try:
+        while page <= last_page or pending:
+            while page <= last_page and len(pending) < PAGE_PREFETCH:
+                pending.append(asyncio.create_task(
+                    _request(url, params={**params, "page": page})
+                ))
+                page += 1
+
+            items = (await pending.popleft()).json()
+            if not items:
+                break
+            yield items
+    finally:
+        _discard(pending)
+
+
+async def iter_pr_files(
+    owner: str,
+    repo: str,
+    pr_number: int,
+    changed_files: int | None = None,
+):
+    """
+    Stream the files of a PR across all pages (GitHub lists at most 3000).
+    Consumers may stop early; outstanding page requests are cancelled when
+    the generator is closed.
+    """
+    url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}/files"
+
+    if changed_files is not None:
+        changed_files = min(changed_files, MAX_PR_FILES)
+
+    async with aclosing(_iter_pages(url, total_items=changed_files)) as pages:
+        async for page in pages:
+            for file in page:
+                yield file
+
+
+async def fetch_open_pr_numbers(
+    owner: str, repo: str, limit: int | None = None
+) -> list[int]:
+    url = f"{BASE_URL}/repos/{owner}/{repo}/pulls"
+    numbers = []
+
+    async with aclosing(_iter_pages(url, params={"state": "open"})) as pages:
+        async for page in pages:
+            for pr in page:
+                numbers.append(pr["number"])
+                if limit is not None and len(numbers) >= limit:
+                    return numbers
+
+    return numbers
+
+
 async def fetch_pr(owner: str, repo: str, pr_number: int) -> dict:
     url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}"
     return await _get(url)
 
 
-async def fetch_pr_files(owner: str, repo: str, pr_number: int) -> list[dict]:
-    url = f"{BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}/files"
-    return await _get(url)
+async def fetch_pr_files(
+    owner: str,
+    repo: str,
+    pr_number: int,
+    changed_files: int | None = None,
+    keep_patches: int | None = None,
+) -> list[dict]:
+    """
+    Collect all files of a PR.
+
+    With keep_patches, only the N files with the most churn keep their
+    patch text, so very large PRs don't hold every diff in memory.
+    """
+    files = []
+    largest = []  # min-heap of (churn, index) for files that kept a patch
+
+    async with aclosing(
+        iter_pr_files(owner, repo, pr_number, changed_files)
+    ) as stream:
+        async for file in stream:
+            if keep_patches is not None:
+                churn = file.get("additions", 0) + file.get("deletions", 0)
+                # ties keep the earlier file, matching a stable sort
+                entry = (churn, -len(files))
+
+                if len(largest) < keep_patches:
+                    heapq.heappush(largest, entry)
+                elif keep_patches and entry > largest[0]:
+                    _, dropped = heapq.heapreplace(largest, entry)
+                    files[-dropped].pop("patch", None)
+                else:
+                    file.pop("patch", None)
+
+            files.append(file)
+
+    return files
 
 
 async def fetch_recent_commits(
@@ -71,20 +385,100 @@ async def fetch_recent_commits(
     return messages
 
 
+async def fetch_changed_files(
+    owner: str, repo: str, base: str, head: str
+) -> set[str] | None:
+    """
+    Names of the files that changed between two commits, or None when that
+    can't be told from the compare API: base is no longer an ancestor of
+    head (force push), base is gone, or the listing hit GitHub's 300-file cap.
+    """
+    url = f"{BASE_URL}/repos/{owner}/{repo}/compare/{base}...{head}"
+    try:
+        comparison = await _get(url)
+    except GitHubAPIError as e:
+        logger.info(f"Compare {base[:7]}...{head[:7]} unavailable: {e.message}")
+        return None
+
+    files = comparison.get("files") or []
+    if comparison.get("status") not in ("ahead", "identical") or len(files) >= 300:
+        return None
+
+    changed = set()
+    for file in files:
+        changed.add(file.get("filename"))
+        if file.get("previous_filename"):
+            changed.add(file["previous_filename"])
+    return changed
+
+
 async def fetch_contributing(owner: str, repo: str) -> str | None:
     paths = [
         "CONTRIBUTING.md",
         ".github/CONTRIBUTING.md",
     ]
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        for path in paths:
-            url = f"{BASE_URL}/repos/{owner}/{repo}/contents/{path}"
-            response = await client.get(url, headers=_headers())
+    for path in paths:
+        url = f"{BASE_URL}/repos/{owner}/{repo}/contents/{path}"
+        try:
+            # through the response cache: the file rarely changes
+            contents = await _get(url)
+        except GitHubAPIError:
+            continue
 
-            if response.status_code == 200:
-                content = response.json().get("content")
-                if content:
-                    return base64.b64decode(content).decode("utf-8")
+        content = contents.get("content")
+        if content:
+            return base64.b64decode(content).decode("utf-8")
 
     return None
+
+
+async def _optional(name: str, lookup: Awaitable) -> Any:
+    # optional lookups degrade to None instead of failing the whole gather
+    try:
+        return await lookup
+    except GitHubAPIError as e:
+        logger.warning(f"Optional GitHub lookup '{name}' failed: {e.message}")
+        return None
+
+
+def _first_error(group: BaseExceptionGroup) -> BaseException:
+    error = group.exceptions[0]
+    while isinstance(error, BaseExceptionGroup):
+        error = error.exceptions[0]
+    return error
+
+
+async def gather_lookups(
+    required: dict[str, Awaitable],
+    optional: dict[str, Awaitable] | None = None,
+) -> dict[str, Any]:
+    """
+    Run GitHub lookups concurrently in one task group.
+
+    A failing required lookup cancels the others and is re-raised as
+    GitHubAPIError. Optional lookups resolve to None on failure.
+    """
+    optional = optional or {}
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = {
+                name: tg.create_task(lookup)
+                for name, lookup in required.items()
+            }
+            tasks.update({
+                name: tg.create_task(_optional(name, lookup))
+                for name, lookup in optional.items()
+            })
+    except* Exception as group:
+        api_errors, others = group.split(GitHubAPIError)
+        if api_errors is not None:
+            raise _first_error(api_errors) from None
+
+        logger.error(f"GitHub lookup failed: {_first_error(others)!r}")
+        raise GitHubAPIError(
+            "Unable to fetch data from GitHub. Please try again."
+        ) from None
+
+    return {name: task.result() for name, task in tasks.items()}
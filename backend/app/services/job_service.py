@@ -0,0 +1,232 @@
+"""
+Background jobs for long-running analyses.
+
+submit() stores a job record and puts it on a bounded in-process queue; a
+fixed pool of worker tasks runs the registered handler for the job's kind.
+Job records (status, per-stage timings, result or error) live in a
+MemoryCache, or an SQLiteCache when JOB_STORE_BACKEND is "sqlite" so any
+worker process sharing the file can answer polls.
+
+Handlers are coroutines taking (payload, stages); they may record stage
+timings into the stages dict.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict
+
+from backend.app.core import metrics
+from backend.app.core.cache import MemoryCache, SQLiteCache
+from backend.app.core.config import settings
+from backend.app.core.exceptions import (
+    ApplicationError,
+    JobNotFoundError,
+    QueueFullError,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# how often waiters re-read a job that runs in another process
+POLL_INTERVAL = 0.5
+# a running job older than its timeout plus this is from a dead process
+STALE_GRACE_SECONDS = 30.0
+
+Handler = Callable[[dict, dict], Awaitable[dict]]
+
+_store: MemoryCache | SQLiteCache | None = None
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_handlers: Dict[str, Handler] = {}
+_done: Dict[str, asyncio.Event] = {}
+
+
+def _build_store() -> MemoryCache | SQLiteCache:
+    if settings.JOB_STORE_BACKEND == "sqlite":
+        return SQLiteCache(
+            settings.JOB_STORE_PATH,
+            settings.JOB_STORE_MAX_BYTES,
+            settings.JOB_RESULT_TTL_SECONDS,
+        )
+    return MemoryCache(settings.JOB_STORE_MAX_BYTES, settings.JOB_RESULT_TTL_SECONDS)
+
+
+async def _save(job: dict) -> None:
+    await _store.aset(job["job_id"], json.dumps(job).encode())
+
+
+async def _load(job_id: str) -> dict | None:
+    raw = await _store.aget(job_id) if _store is not None else None
+    return json.loads(raw) if raw is not None else None
+
+
+async def submit(kind: str, payload: dict) -> dict:
+    if _queue is None:
+        raise ApplicationError("Job queue is not running")
+    if kind not in _handlers:
+        raise ApplicationError(f"Unknown job kind: {kind}")
+    if _queue.full():
+        metrics.increment("jobs.rejected")
+        raise QueueFullError()
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": QUEUED,
+        "payload": payload,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "stages": {},
+        "result": None,
+        "error": None,
+    }
+    await _save(job)
+    # the queue may have filled up while the job was being saved
+    if _queue.full():
+        metrics.increment("jobs.rejected")
+        raise QueueFullError()
+    _done[job["job_id"]] = asyncio.Event()
+    _queue.put_nowait(job["job_id"])
+
+    metrics.increment("jobs.submitted")
+    metrics.set_gauge("jobs.queue_depth", _queue.qsize())
+    return job
+
+
+async def get(job_id: str) -> dict:
+    job = await _load(job_id)
+    if job is None:
+        raise JobNotFoundError(f"Job {job_id} not found")
+
+    if (
+        job["status"] == RUNNING
+        and time.time() - job["started_at"]
+        > settings.JOB_TIMEOUT_SECONDS + STALE_GRACE_SECONDS
+    ):
+        job.update(status=FAILED, error="Job was interrupted")
+
+    return job
+
+
+async def wait(job_id: str, timeout: float) -> dict:
+    """
+    Return the job once it has finished, or as it is after timeout seconds
+    """
+    job = await get(job_id)
+    deadline = time.monotonic() + timeout
+
+    while job["status"] not in FINISHED:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        event = _done.get(job_id)
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+        job = await get(job_id)
+
+    return job
+
+
+async def _finish(job: dict, status: str, **changes) -> None:
+    job.update(status=status, finished_at=time.time(), **changes)
+    job["stages"]["total"] = round(job["finished_at"] - job["created_at"], 4)
+    await _save(job)
+
+    metrics.increment(f"jobs.{status}")
+    metrics.observe("jobs.total", job["finished_at"] - job["created_at"])
+
+    event = _done.pop(job["job_id"], None)
+    if event is not None:
+        event.set()
+
+
+async def _run(job_id: str) -> None:
+    job = await _load(job_id)
+    if job is None:
+        logger.warning(f"Job {job_id} expired before it ran")
+        _done.pop(job_id, None)
+        return
+
+    job.update(status=RUNNING, started_at=time.time())
+    queued = job["started_at"] - job["created_at"]
+    job["stages"]["queued"] = round(queued, 4)
+    metrics.observe("jobs.queue_wait", queued)
+    await _save(job)
+
+    try:
+        async with asyncio.timeout(settings.JOB_TIMEOUT_SECONDS):
+            result = await _handlers[job["kind"]](job["payload"], job["stages"])
+    except asyncio.CancelledError:
+        await _finish(job, FAILED, error="Server shut down before the job finished")
+        raise
+    except ApplicationError as e:
+        await _finish(job, FAILED, error=e.message)
+    except TimeoutError:
+        await _finish(job, FAILED, error="Job timed out")
+    except Exception:
+        logger.exception(f"Job {job_id} failed")
+        await _finish(job, FAILED, error="Unexpected server error.")
+    else:
+        await _finish(job, SUCCEEDED, result=result)
+
+
+async def _worker() -> None:
+    while True:
+        job_id = await _queue.get()
+        metrics.set_gauge("jobs.queue_depth", _queue.qsize())
+        metrics.adjust_gauge("jobs.running", 1)
+        try:
+            await _run(job_id)
+        finally:
+            metrics.adjust_gauge("jobs.running", -1)
+
+
+async def start(handlers: Dict[str, Handler]) -> None:
+    global _store, _queue
+
+    _handlers.update(handlers)
+    _store = _build_store()
+    _queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_SIZE)
+    _workers.extend(
+        asyncio.create_task(_worker()) for _ in range(settings.JOB_WORKERS)
+    )
+    logger.info(
+        f"Job queue started: {settings.JOB_WORKERS} workers, "
+        f"{settings.JOB_QUEUE_SIZE} slots, {settings.JOB_STORE_BACKEND} store"
+    )
+
+
+async def stop() -> None:
+    global _store, _queue
+
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    # jobs that never started
+    while _queue is not None and not _queue.empty():
+        job = await _load(_queue.get_nowait())
+        if job is not None:
+            await _finish(job, FAILED, error="Server shut down before the job ran")
+
+    if isinstance(_store, SQLiteCache):
+        _store.close()
+    _store = None
+    _queue = None
@@ -1,9 +1,44 @@
 import logging
-from ml.apis.llm import generate_review as ml_generate_review
+from typing import AsyncIterator, Tuple
+
+from backend.app.core.circuit_breaker import CircuitOpenError
+from ml.apis.llm import (
+    MODEL_NAME as REVIEW_MODEL,
+    diff_token_budget,
+    generate_review as ml_generate_review,
+    generate_summary as ml_generate_summary,
+    stream_review as ml_stream_review,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _fallback_review() -> dict:
+    return {
+        "risk_explanation": (
+            "AI review is temporarily unavailable. "
+            "Risk assessment is still provided, but detailed code analysis "
+            "could not be generated at this time."
+        ),
+        "mitigation_steps": [
+            "Please review the pull request manually.",
+            "Try again later if AI analysis is required."
+        ],
+        "file_reviews": [],
+        "source": "fallback"
+    }
+
+
+def _log_failure(e: Exception) -> None:
+    logger.error(f"LLM failure: {e}")
+
+    # If quota exceeded, degrade gracefully
+    if "quota" in str(e).lower() or "429" in str(e):
+        logger.warning("LLM quota exceeded. Returning fallback.")
+    else:
+        logger.warning("LLM unexpected failure. Returning fallback.")
+
+
 async def generate_review(llm_context: dict) -> dict:
     try:
         logger.info("Calling LLM layer")
@@ -17,26 +52,57 @@ async def generate_review(llm_context: dict) -> dict:
 
         return result
 
-    except Exception as e:
-        logger.error(f"LLM failure: {e}")
+    except CircuitOpenError as e:
+        # failing fast on purpose; the failures that opened it were logged
+        logger.warning(f"{e}. Returning fallback.")
+        return _fallback_review()
 
-        # If quota exceeded, degrade gracefully
-        if "quota" in str(e).lower() or "429" in str(e):
-            logger.warning("LLM quota exceeded. Returning fallback.")
-        else:
-            logger.warning("LLM unexpected failure. Returning fallback.")
+    except Exception as e:
+        _log_failure(e)
 
         # Always return graceful fallback instead of raising error
-        return {
-            "risk_explanation": (
-                "AI review is temporarily unavailable. "
-                "Risk assessment is still provided, but detailed code analysis "
-                "could not be generated at this time."
-            ),
-            "mitigation_steps": [
-                "Please review the pull request manually.",
-                "Try again later if AI analysis is required."
-            ],
-            "file_reviews": [],
-            "source": "fallback"
-        }
\ No newline at end of file
+        return _fallback_review()
+
+
+async def generate_summary(llm_context: dict) -> dict:
+    """
+    Summary-only pass for a PR whose file reviews were all reused; same
+    fallback behaviour as generate_review.
+    """
+    try:
+        logger.info("Calling LLM layer for a summary")
+
+        result = await ml_generate_summary(llm_context)
+        if result.get("source") == "fallback":
+            logger.warning("LLM returned fallback response.")
+        return result
+
+    except CircuitOpenError as e:
+        logger.warning(f"{e}. Returning fallback.")
+        return _fallback_review()
+
+    except Exception as e:
+        _log_failure(e)
+        return _fallback_review()
+
+
+async def stream_review(llm_context: dict) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streaming generate_review: ("file_review", ...) events, then exactly one
+    ("review", ...) event, which is the fallback if the LLM layer fails.
+    """
+    try:
+        logger.info("Streaming from LLM layer")
+
+        async for event, data in ml_stream_review(llm_context):
+            if event == "review" and data.get("source") == "fallback":
+                logger.warning("LLM returned fallback response.")
+            yield event, data
+
+    except CircuitOpenError as e:
+        logger.warning(f"{e}. Returning fallback.")
+        yield "review", _fallback_review()
+
+    except Exception as e:
+        _log_failure(e)
+        yield "review", _fallback_review()
@@ -1,11 +1,217 @@
-from ml.apis.predict import prepare_features, predict_risk as ml_predict
-from backend.app.core.exceptions import MLServiceError
+import asyncio
+import hashlib
+import logging
+import random
+import time
 
-async def predict_risk(normalized_data: dict) -> dict:
+from ml.apis.predict import (
+    active_manifest,
+    active_version,
+    challenger_version,
+    clear_challenger,
+    is_loaded,
+    load_challenger as ml_load_challenger,
+    load_model as ml_load_model,
+    prepare_features,
+    predict_risk as ml_predict,
+    predict_risk_raw_batch as ml_predict_batch,
+    warm_up,
+)
+from ml.models import registry
+from backend.app.core import metrics
+from backend.app.core.config import settings
+from backend.app.core.exceptions import MLServiceError, ModelReloadError
+from backend.app.services import shadow_service
+
+logger = logging.getLogger(__name__)
+
+_load_error: str | None = None
+_reload_lock = asyncio.Lock()
+
+
+def _registry_dir():
+    return settings.MODEL_REGISTRY_DIR or registry.REGISTRY_DIR
+
+
+async def load_model() -> None:
+    """
+    Load and warm up the model at startup. A failure is recorded for the
+    readiness probe instead of crashing the app.
+    """
+    global _load_error
+
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(
+            ml_load_model,
+            settings.MODEL_MMAP_MODE or None,
+            None,
+            _registry_dir(),
+        )
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        _load_error = f"{type(e).__name__}: {e}"
+        logger.error(f"Model failed to load: {_load_error}")
+        return
+
+    _load_error = None
+    logger.info(f"Model loaded and warmed up in {time.perf_counter() - start:.2f}s")
+
+
+def readiness() -> dict:
+    return {
+        "model_loaded": is_loaded() and _load_error is None,
+        "model_version": active_version(),
+        "error": _load_error,
+    }
+
+
+def model_info() -> dict:
+    return {
+        "version": active_version(),
+        "manifest": active_manifest(),
+        "available": registry.versions(_registry_dir()),
+        "challenger": challenger_version(),
+    }
+
+
+async def reload_model(version: str | None = None) -> dict:
+    """
+    Load a model version in a worker thread and swap it in. Requests keep
+    using the previous model until the swap, and keep using it if the load
+    fails. An explicit version also becomes the registry's current one, so
+    a rollback sticks: watch_registry (in every worker) follows the pointer
+    instead of switching back.
+    """
+    global _load_error
+
+    async with _reload_lock:
+        previous = active_version()
+        try:
+            with metrics.timer("model.reload"):
+                loaded = await asyncio.to_thread(
+                    ml_load_model,
+                    settings.MODEL_MMAP_MODE or None,
+                    version,
+                    _registry_dir(),
+                )
+        except Exception as e:
+            metrics.increment("model.reload.failures")
+            logger.error(f"Model reload failed, keeping {previous}: {e}")
+            raise ModelReloadError(f"Could not load model version {version or 'current'}: {e}")
+
+        if version is not None:
+            try:
+                await asyncio.to_thread(_set_current, version)
+            except Exception as e:
+                logger.warning(f"Could not point the model registry at {version}: {e}")
+
+        _load_error = None
+        metrics.increment("model.reload.success")
+        logger.info(f"Model reloaded: {previous} -> {loaded}")
+        return model_info()
+
+
+def _set_current(version: str) -> None:
+    if registry.current_version(_registry_dir()) != version:
+        registry.set_current(version, _registry_dir())
+        logger.info(f"Model registry now points at {version}")
+
+
+async def watch_registry(interval: float) -> None:
+    """
+    Reload whenever the registry's current version differs from the active
+    one (e.g. after "registry activate" or a training run with --publish)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = await asyncio.to_thread(registry.current_version, _registry_dir())
+            if current and current != active_version():
+                await reload_model(current)
+        except Exception as e:
+            logger.warning(f"Model registry watch failed: {e}")
+
+async def start_challenger() -> None:
+    """
+    Load the configured challenger and start the shadow worker. A challenger
+    that fails to load only disables shadow scoring.
+    """
+    version = settings.CHALLENGER_MODEL_VERSION
+    if not version:
+        return
+
+    try:
+        await asyncio.to_thread(
+            ml_load_challenger,
+            version,
+            settings.MODEL_MMAP_MODE or None,
+            _registry_dir(),
+        )
+    except Exception as e:
+        logger.error(f"Challenger model {version} failed to load: {e}")
+        return
+
+    await shadow_service.start(settings.SHADOW_LOG_PATH, settings.SHADOW_QUEUE_SIZE)
+
+
+async def stop_challenger() -> None:
+    await shadow_service.stop()
+    clear_challenger()
+
+
+def _route(routing_key: str | None) -> str:
+    """
+    "challenger" for CHALLENGER_TRAFFIC_PERCENT of keys in split mode. The
+    same PR always lands on the same side.
+    """
+    if settings.CHALLENGER_MODE != "split" or challenger_version() is None:
+        return "primary"
+
+    if routing_key:
+        digest = hashlib.sha256(routing_key.encode()).digest()
+        bucket = int.from_bytes(digest[:4], "big") % 10000 / 100
+    else:
+        bucket = random.uniform(0, 100)
+
+    return "challenger" if bucket < settings.CHALLENGER_TRAFFIC_PERCENT else "primary"
+
+
+async def predict_risk(normalized_data: dict, routing_key: str | None = None) -> dict:
     try:
         features = prepare_features(normalized_data)
-        return ml_predict(features)
+        served = _route(routing_key)
+
+        if served == "challenger":
+            try:
+                result = ml_predict(features, challenger=True)
+            except Exception as e:
+                logger.warning(f"Challenger scoring failed, serving primary: {e}")
+                served, result = "primary", ml_predict(features)
+        else:
+            result = ml_predict(features)
+    except Exception:
+        raise MLServiceError(
+            "Risk prediction service is currently unavailable."
+        )
+
+    # the other model is scored later by the shadow worker
+    if shadow_service.enabled():
+        shadow_service.submit(
+            shadow_service.new_record(
+                routing_key, settings.CHALLENGER_MODE, served, result
+            ),
+            features,
+            "primary" if served == "challenger" else "challenger",
+        )
+
+    return result
+
+
+async def predict_risk_batch(normalized_data: list[dict]) -> list[dict]:
+    try:
+        return await asyncio.to_thread(ml_predict_batch, normalized_data)
     except Exception:
         raise MLServiceError(
             "Risk prediction service is currently unavailable."
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,144 @@
+"""
+Off-request-path scoring for the challenger model.
+
+ml_service.predict_risk hands over the features and the score it already
+returned; a background worker scores the other model in batches and appends
+one JSON line per request to an append-only log:
+
+    {"ts": ..., "key": "<pr url>", "mode": "shadow", "served": "primary",
+     "primary": {"version", "risk_score", "risk_label"},
+     "challenger": {"version", "risk_score", "risk_label"}}
+
+submit never waits: when the queue is full the record is dropped and
+counted, so a slow disk or a slow challenger can't add request latency.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+from ml.apis.predict import predict_risk_batch as ml_predict_batch
+from backend.app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH = 64
+
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+_path: Path | None = None
+
+
+def summary(result: dict) -> dict:
+    return {
+        "version": result.get("model_version"),
+        "risk_score": result["risk_score"],
+        "risk_label": result["risk_label"],
+    }
+
+
+def new_record(key: str | None, mode: str, served: str, result: dict) -> dict:
+    return {
+        "ts": time.time(),
+        "key": key,
+        "mode": mode,
+        "served": served,
+        served: summary(result),
+    }
+
+
+def enabled() -> bool:
+    return _queue is not None
+
+
+def submit(record: dict, features: dict, role: str) -> None:
+    """
+    Queue record for logging once role ("primary" or "challenger") has
+    been scored on features
+    """
+    if _queue is None:
+        return
+
+    try:
+        _queue.put_nowait((record, features, role))
+    except asyncio.QueueFull:
+        metrics.increment("shadow.dropped")
+        return
+
+    metrics.set_gauge("shadow.queue_depth", _queue.qsize())
+
+
+def _score_and_append(items: list, path: Path) -> None:
+    for role in ("primary", "challenger"):
+        pending = [(record, features) for record, features, r in items if r == role]
+        if not pending:
+            continue
+
+        results = ml_predict_batch(
+            [features for _, features in pending],
+            challenger=role == "challenger",
+            factors=False,
+        )
+        for (record, _), result in zip(pending, results):
+            record[role] = summary(result)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(record) + "\n" for record, _, _ in items)
+
+
+async def _run(path: Path) -> None:
+    while True:
+        items = [await _queue.get()]
+        while len(items) < WRITE_BATCH and not _queue.empty():
+            items.append(_queue.get_nowait())
+
+        try:
+            with metrics.timer("shadow.batch"):
+                await asyncio.to_thread(_score_and_append, items, path)
+            metrics.increment("shadow.logged", len(items))
+        except Exception as e:
+            metrics.increment("shadow.errors", len(items))
+            logger.warning(f"Shadow scoring failed for {len(items)} requests: {e}")
+
+        metrics.set_gauge("shadow.queue_depth", _queue.qsize())
+
+
+async def start(path: str, queue_size: int) -> None:
+    global _queue, _worker, _path
+
+    _path = Path(path)
+    _path.parent.mkdir(parents=True, exist_ok=True)
+
+    _queue = asyncio.Queue(maxsize=queue_size)
+    _worker = asyncio.create_task(_run(_path))
+    logger.info(f"Shadow scoring enabled, logging to {_path}")
+
+
+async def stop() -> None:
+    """
+    Stop the worker and flush whatever is still queued
+    """
+    global _queue, _worker
+
+    if _worker is None:
+        return
+
+    _worker.cancel()
+    try:
+        await _worker
+    except asyncio.CancelledError:
+        pass
+
+    items = []
+    while not _queue.empty():
+        items.append(_queue.get_nowait())
+    if items:
+        try:
+            await asyncio.to_thread(_score_and_append, items, _path)
+        except Exception as e:
+            logger.warning(f"Dropped {len(items)} shadow records on shutdown: {e}")
+
+    _queue = None
+    _worker = None
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from backend.app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-progress task.
+
+    The first caller starts the work; callers arriving while it runs await
+    the same task and receive its result (or exception). The task is
+    shielded, so a leader that disconnects does not cancel it for the rest.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            metrics.increment(f"singleflight.{self.name}.calls")
+        else:
+            logger.info(f"Coalescing {self.name} request for {key}")
+            metrics.increment(f"singleflight.{self.name}.coalesced")
+
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+        # nobody may be left awaiting a shielded task
+        if not task.cancelled():
+            task.exception()
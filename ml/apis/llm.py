@@ -1,20 +1,61 @@
+import json
 import logging
 import asyncio
 import re
-from typing import Dict, Any, List
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, List, Tuple
 
 from google import genai
 from google.genai.errors import ClientError
+from backend.app.core import metrics
+from backend.app.core.circuit_breaker import (
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+)
 from backend.app.core.config import settings
+from backend.app.services.diff_selector import packed_files
+from ml.apis import review_cache
 
 logger = logging.getLogger(__name__)
 
 MODEL_NAME = "models/gemini-2.5-flash"
 MAX_RETRIES = 3
-MAX_PROMPT_CHARS = 12000
+
+# Tokens of diff sent per model. The diff is packed to this budget before the
+# prompt is built, so nothing is cut afterwards; title and body keep their
+# own character caps.
+DIFF_TOKEN_BUDGETS = {
+    "models/gemini-2.5-flash": 6000,
+    "models/gemini-2.5-pro": 12000,
+}
+DEFAULT_DIFF_TOKEN_BUDGET = 4000
+CHARS_PER_TOKEN = 4
+# file names listed in a prompt; the rest are only counted
+MAX_LISTED_FILES = 50
 
 client = genai.Client(api_key=settings.GEMINI_API_KEY)
 
+# caps in-flight Gemini calls per process; extra requests wait here
+_llm_slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+# shared by every review in the process; see _record_outcome
+breaker = CircuitBreaker(
+    "llm",
+    settings.LLM_BREAKER_ERROR_RATE,
+    settings.LLM_BREAKER_WINDOW,
+    settings.LLM_BREAKER_MIN_CALLS,
+    settings.LLM_BREAKER_COOLDOWN_SECONDS,
+)
+retry_budget = RetryBudget(
+    "llm", settings.LLM_RETRY_BUDGET_RATIO, settings.LLM_RETRY_BUDGET_MAX
+)
+
+# e.g. "429 RESOURCE_EXHAUSTED. {... 'retryDelay': '37s' ...}"
+RETRY_DELAY = re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s")
+
 SCHEMA = {
     "type": "object",
     "properties": {
@@ -47,6 +88,8 @@ SCHEMA = {
         },
     },
     "required": ["risk_explanation", "mitigation_steps", "file_reviews"],
+    # file reviews first, so streamed responses can be shown file by file
+    "propertyOrdering": ["file_reviews", "risk_explanation", "mitigation_steps"],
 }
 
 
@@ -56,6 +99,41 @@ def _truncate(text: str, limit: int = 4000) -> str:
     return text[:limit]
 
 
+def diff_token_budget(model: str = MODEL_NAME) -> int:
+    return settings.LLM_DIFF_TOKEN_BUDGET or DIFF_TOKEN_BUDGETS.get(
+        model, DEFAULT_DIFF_TOKEN_BUDGET
+    )
+
+
+def _fit_diff(patch: str, budget: int) -> str:
+    """
+    Packed diffs already fit; anything longer is cut at a line boundary
+    """
+    limit = budget * CHARS_PER_TOKEN
+    if not patch or len(patch) <= limit:
+        return patch or ""
+    return patch[:patch.rfind("\n", 0, limit) + 1]
+
+
+def _files_changed(context: Dict) -> str:
+    """
+    The files whose diff is in the prompt, topped up with other changed
+    files up to MAX_LISTED_FILES, plus a count of the rest. The full list
+    stays in context["file_names"] for validation.
+    """
+    files = context.get("file_names", [])
+    packed = packed_files(context.get("selected_patch") or "")
+
+    listed = [name for name in files if name in packed]
+    listed += [name for name in files if name not in packed][
+        :max(MAX_LISTED_FILES - len(listed), 0)
+    ]
+    line = ", ".join(listed)
+    if len(files) > len(listed):
+        line += f" and {len(files) - len(listed)} more"
+    return line
+
+
 def _sanitize_code(code: str) -> str:
     """
     Clean and normalize code examples returned by the LLM.
@@ -134,6 +212,19 @@ def _sanitize_code(code: str) -> str:
     return code.strip()
 
 
+def _validate_file_review(review: Dict[str, Any], files: List[str]) -> bool:
+    if not isinstance(review, dict) or review.get("file") not in files:
+        return False
+    issues = review.get("issues")
+    if not isinstance(issues, list):
+        return False
+    for issue in issues:
+        if not isinstance(issue, dict) or not issue.get("description"):
+            return False
+
+    return True
+
+
 def _validate_structure(result: Dict[str, Any], context: Dict) -> bool:
     files = context.get("file_names", [])
     file_reviews = result.get("file_reviews")
@@ -141,17 +232,76 @@ def _validate_structure(result: Dict[str, Any], context: Dict) -> bool:
     if not isinstance(file_reviews, list):
         return False
 
-    for review in file_reviews:
-        if review.get("file") not in files:
-            return False
-        issues = review.get("issues")
-        if not isinstance(issues, list):
-            return False
-        for issue in issues:
-            if not issue.get("description"):
-                return False
+    return all(_validate_file_review(review, files) for review in file_reviews)
 
-    return True
+
+def _sanitize_file_review(file_review: Dict[str, Any]) -> Dict[str, Any]:
+    for issue in file_review.get("issues", []):
+        if issue.get("code_example"):
+            issue["code_example"] = _sanitize_code(issue["code_example"])
+    return file_review
+
+
+class _FileReviewScanner:
+    """
+    Incremental scanner over streamed JSON text. feed() returns every
+    object of the top-level "file_reviews" array that completed in the new
+    text; the full text stays in .text for the final parse.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._key = None
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.text += chunk
+        completed = []
+
+        while self._pos < len(self.text):
+            ch = self.text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = self.text[self._string_start + 1:self._pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch == ":" and len(self._stack) == 1:
+                self._key = self._last_string
+            elif ch in "{[":
+                self._stack.append(ch)
+                if (
+                    ch == "{"
+                    and self._stack[:2] == ["{", "["]
+                    and len(self._stack) == 3
+                    and self._key == "file_reviews"
+                ):
+                    self._item_start = self._pos
+            elif ch in "}]":
+                if ch == "}" and len(self._stack) == 3 and self._item_start is not None:
+                    try:
+                        completed.append(json.loads(self.text[self._item_start:self._pos + 1]))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+                if self._stack:
+                    self._stack.pop()
+
+            self._pos += 1
+
+        return completed
 
 
 def _build_prompt(context: Dict) -> str:
@@ -213,7 +363,7 @@ Context:
 
 Risk Score: {context.get("risk_score")}
 Risk Label: {context.get("risk_label")}
-Files Changed: {", ".join(context.get("file_names", []))}
+Files Changed: {_files_changed(context)}
 
 Title:
 {_truncate(context.get("title", ""), 1000)}
@@ -222,31 +372,381 @@ Body:
 {_truncate(context.get("body", ""), 3000)}
 
 Diff:
-{_truncate(context.get("selected_patch", ""), 4000)}
+{_fit_diff(context.get("selected_patch", ""), diff_token_budget())}
+"""
+
+    guidelines = _truncate(context.get("contributing") or "", MAX_GUIDELINES_CHARS)
+    if guidelines:
+        prompt += f"""
+The repository's contribution guidelines. Flag changes that break them:
+{guidelines}
 """
 
-    if len(prompt) > MAX_PROMPT_CHARS:
-        prompt = prompt[:MAX_PROMPT_CHARS]
+    previous = _findings(context.get("previous_findings", []))
+    if previous:
+        prompt += f"""
+Findings on the other files of this Pull Request, which are unchanged since
+they were reviewed. Do not review those files again, but take these findings
+into account in risk_explanation and mitigation_steps, which cover the whole
+Pull Request:
+{previous}
+"""
 
     return prompt
 
 
+GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "response_mime_type": "application/json",
+    "response_schema": SCHEMA,
+}
+
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "risk_explanation": {"type": "string"},
+        "mitigation_steps": {
+            "type": "array",
+            "items": {"type": "string"},
+        },
+    },
+    "required": ["risk_explanation", "mitigation_steps"],
+}
+
+SUMMARY_CONFIG = {**GENERATION_CONFIG, "response_schema": SUMMARY_SCHEMA}
+
+MAX_MITIGATION_STEPS = 6
+MAX_FINDINGS_CHARS = 6000
+MAX_GUIDELINES_CHARS = 4000
+
+
+def _fallback() -> Dict[str, Any]:
+    return {
+        "risk_explanation": "LLM validation failed. Manual review recommended.",
+        "mitigation_steps": ["Perform manual review."],
+        "file_reviews": [],
+        "source": "fallback"
+    }
+
+
+def _findings(file_reviews: List[Dict]) -> str:
+    """One "- file: issue" line per issue, capped at MAX_FINDINGS_CHARS."""
+    return _truncate(
+        "\n".join(
+            f"- {review['file']}: {issue['description']}"
+            for review in file_reviews
+            for issue in review["issues"]
+        ),
+        MAX_FINDINGS_CHARS,
+    )
+
+
+def _build_summary_prompt(context: Dict, file_reviews: List[Dict]) -> str:
+    findings = _findings([*file_reviews, *context.get("previous_findings", [])])
+
+    return f"""
+You are a strict senior software engineer summarizing a security review of a GitHub Pull Request.
+Each file was reviewed separately; their findings are listed below.
+
+Return strictly valid JSON only, with this schema:
+
+{{
+  "risk_explanation": string,
+  "mitigation_steps": string[]
+}}
+
+Explain the overall risk of the Pull Request in a few sentences and give at
+most {MAX_MITIGATION_STEPS} mitigation steps, most important first.
+
+Risk Score: {context.get("risk_score")}
+Risk Label: {context.get("risk_label")}
+Top Risk Factors: {", ".join(context.get("top_risk_factors", []))}
+Files Changed: {_files_changed(context)}
+
+Title:
+{_truncate(context.get("title", ""), 1000)}
+
+Findings:
+{findings or "No issues were found."}
+"""
+
+
+@asynccontextmanager
+async def _llm_slot():
+    """Hold one of the per-process Gemini call slots."""
+    queued_at = time.perf_counter()
+    metrics.adjust_gauge("llm.waiting", 1)
+    try:
+        await _llm_slots.acquire()
+    finally:
+        metrics.adjust_gauge("llm.waiting", -1)
+
+    metrics.observe("llm.queue_wait", time.perf_counter() - queued_at)
+    metrics.adjust_gauge("llm.in_flight", 1)
+
+    try:
+        yield
+    finally:
+        metrics.adjust_gauge("llm.in_flight", -1)
+        _llm_slots.release()
+
+
+def _is_quota_error(e: BaseException) -> bool:
+    return isinstance(e, ClientError) and (e.code == 429 or "429" in str(e))
+
+
+def _quota_delay(e: BaseException) -> float | None:
+    match = RETRY_DELAY.search(str(e))
+    return float(match[1]) if match else None
+
+
+def _record_outcome(error: BaseException | None) -> None:
+    """
+    Feed the breaker one Gemini call's outcome. A 429 opens it for the
+    quota's retry delay; other 4xx mean Gemini answered and the request was
+    at fault, so they count as successes. 5xx, timeouts and connection
+    errors count as failures.
+    """
+    if error is None:
+        breaker.record_success()
+    elif _is_quota_error(error):
+        breaker.record_failure(cooldown=_quota_delay(error) or breaker.cooldown)
+    elif isinstance(error, ClientError):
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+async def _generate_content(prompt: str, config: Dict = GENERATION_CONFIG):
+    """
+    Call Gemini through the SDK's async client under the concurrency cap.
+    A call cancelled while still queued for a slot gives back the breaker's
+    probe slot just like one cancelled mid-request.
+    """
+    try:
+        async with _llm_slot():
+            with metrics.timer("llm.call"):
+                async with asyncio.timeout(settings.LLM_TIMEOUT_SECONDS):
+                    response = await client.aio.models.generate_content(
+                        model=MODEL_NAME,
+                        contents=prompt,
+                        config=config,
+                    )
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        _record_outcome(e)
+        raise
+
+    _record_outcome(None)
+    return response
+
+
+async def _stream_content(prompt: str) -> AsyncIterator[str]:
+    """
+    Stream Gemini's response text under the concurrency cap. The timeout
+    applies to the first chunk and to each gap between chunks.
+    """
+    try:
+        async with _llm_slot():
+            with metrics.timer("llm.stream"):
+                async with asyncio.timeout(settings.LLM_TIMEOUT_SECONDS):
+                    stream = await client.aio.models.generate_content_stream(
+                        model=MODEL_NAME,
+                        contents=prompt,
+                        config=GENERATION_CONFIG,
+                    )
+
+                chunks = aiter(stream)
+                while True:
+                    try:
+                        async with asyncio.timeout(settings.LLM_TIMEOUT_SECONDS):
+                            chunk = await anext(chunks)
+                    except StopAsyncIteration:
+                        break
+                    if chunk.text:
+                        yield chunk.text
+    except (asyncio.CancelledError, GeneratorExit):
+        breaker.release()
+        raise
+    except Exception as e:
+        _record_outcome(e)
+        raise
+
+    _record_outcome(None)
+
+
+def _may_retry() -> bool:
+    """
+    Whether a failed attempt may be retried: not while the breaker is open
+    (the retry would be rejected anyway), and only while the shared retry
+    budget lasts.
+    """
+    if breaker.state == OPEN:
+        return False
+    return retry_budget.withdraw()
+
+
+def _check_breaker() -> None:
+    """Raise CircuitOpenError if the last attempt left the breaker open."""
+    if breaker.state == OPEN:
+        raise CircuitOpenError(breaker.name, breaker.retry_after())
+
+
+def _merged_summary(results: List[Dict]) -> Dict[str, Any] | None:
+    # used when the summary call fails: first shard holds the riskiest files
+    if not results:
+        return None
+    steps = dict.fromkeys(
+        step for result in results for step in result["mitigation_steps"]
+    )
+    return {
+        "risk_explanation": results[0]["risk_explanation"],
+        "mitigation_steps": list(steps)[:MAX_MITIGATION_STEPS],
+    }
+
+
+async def _summarize(
+    context: Dict, results: List[Dict], file_reviews: List[Dict]
+) -> Dict | None:
+    prompt = _build_summary_prompt(context, file_reviews)
+
+    cache_key = review_cache.review_key(prompt, MODEL_NAME, SUMMARY_CONFIG)
+    cached = await review_cache.get_review(cache_key)
+    if cached is not None:
+        return cached
+
+    if not breaker.allow():
+        logger.warning("LLM circuit open, merging shard summaries")
+        return _merged_summary(results)
+
+    try:
+        response = await _generate_content(prompt, SUMMARY_CONFIG)
+        summary = dict(response.parsed or {})
+        if not isinstance(summary.get("risk_explanation"), str) or not isinstance(
+            summary.get("mitigation_steps"), list
+        ):
+            raise ValueError("Summary validation failed")
+    except Exception as e:
+        logger.warning(f"Summary pass failed, merging shard summaries: {e}")
+        return _merged_summary(results)
+
+    summary = {
+        "risk_explanation": summary["risk_explanation"],
+        "mitigation_steps": summary["mitigation_steps"][:MAX_MITIGATION_STEPS],
+    }
+    await review_cache.store_review(cache_key, summary)
+    return summary
+
+
+async def _iter_shards(context: Dict) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Review every shard concurrently (at most LLM_SHARD_CONCURRENCY at once,
+    and still under the process-wide slots). Yields (index, review) as each
+    shard finishes; a quota error or open circuit from any shard cancels
+    the rest.
+    """
+    slots = asyncio.Semaphore(settings.LLM_SHARD_CONCURRENCY)
+
+    async def review_shard(index: int, shard: Dict) -> Tuple[int, Dict[str, Any]]:
+        async with slots:
+            # earlier findings only go into the summary pass
+            return index, await generate_review(
+                {**context, **shard, "shards": [], "previous_findings": []}
+            )
+
+    tasks = [
+        asyncio.create_task(review_shard(index, shard))
+        for index, shard in enumerate(context["shards"])
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _review_shards(context: Dict) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Sharded review: ("file_review", review) events as shards finish, then
+    ("review", merged) with a summary written over all shards' findings.
+    Failed shards are left out; if every shard fails the fallback is returned.
+    The merged review lists the files of the shards that succeeded under
+    "reviewed_files", so files of failed shards are not taken as clean.
+    """
+    shards = context["shards"]
+    results: List[Dict | None] = [None] * len(shards)
+    reviewed: List[str] = []
+
+    with metrics.timer("llm.sharded"):
+        async for index, result in _iter_shards(context):
+            if result.get("source") == "fallback":
+                logger.warning(f"Review shard {index + 1}/{len(shards)} failed")
+                metrics.increment("llm.shards.failed")
+                continue
+
+            results[index] = result
+            reviewed.extend(shards[index]["file_names"])
+            metrics.increment("llm.shards.succeeded")
+            for file_review in result["file_reviews"]:
+                yield "file_review", file_review
+
+        results = [result for result in results if result is not None]
+        if not results:
+            yield "review", _fallback()
+            return
+
+        file_reviews = [review for result in results for review in result["file_reviews"]]
+        summary = await _summarize(context, results, file_reviews)
+
+    yield "review", {
+        **summary,
+        "file_reviews": file_reviews,
+        "reviewed_files": reviewed,
+        "source": "llm",
+        "cached": all(result.get("cached") for result in results),
+    }
+
+
+async def generate_summary(context: Dict) -> Dict[str, Any]:
+    """
+    PR-wide risk explanation and mitigation steps when every file review
+    was reused (context["previous_findings"]), without reviewing any file.
+    """
+    summary = await _summarize(context, [], [])
+    if summary is None:
+        return _fallback()
+
+    return {**summary, "file_reviews": [], "source": "llm"}
+
+
 async def generate_review(context: Dict) -> Dict[str, Any]:
+    if context.get("shards"):
+        async for event, data in _review_shards(context):
+            if event == "review":
+                return data
+
     prompt = _build_prompt(context)
 
+    cache_key = review_cache.review_key(prompt, MODEL_NAME, GENERATION_CONFIG)
+    cached = await review_cache.get_review(cache_key)
+    if cached is not None:
+        logger.info("LLM review served from cache")
+        cached["cached"] = True
+        return cached
+
+    retry_budget.deposit()
+
     for attempt in range(1, MAX_RETRIES + 1):
+        breaker.check()
+
         try:
             logger.info(f"Calling Gemini LLM (attempt {attempt})")
 
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config={
-                    "temperature": 0.2,
-                    "response_mime_type": "application/json",
-                    "response_schema": SCHEMA,
-                },
-            )
+            response = await _generate_content(prompt)
 
             if not response.parsed:
                 raise ValueError("Structured parsing failed")
@@ -256,15 +756,14 @@ async def generate_review(context: Dict) -> Dict[str, Any]:
 
 
             for file_review in result.get("file_reviews", []):
-                for issue in file_review.get("issues", []):
-                    if issue.get("code_example"):
-                        issue["code_example"] = _sanitize_code(issue["code_example"])
+                _sanitize_file_review(file_review)
 
             
             if not _validate_structure(result, context):
                 raise ValueError("Structure validation failed")
 
             logger.info("LLM validated successfully")
+            await review_cache.store_review(cache_key, result)
             return result
 
         except ClientError as e:
@@ -276,14 +775,95 @@ async def generate_review(context: Dict) -> Dict[str, Any]:
         except Exception as e:
             logger.warning(f"Attempt {attempt} failed: {e}")
 
-        if attempt < MAX_RETRIES:
-            await asyncio.sleep(2 ** attempt)
+        if attempt == MAX_RETRIES or not _may_retry():
+            break
+        await asyncio.sleep(2 ** attempt)
 
+    _check_breaker()
     logger.error("LLM failed after retries")
 
-    return {
-        "risk_explanation": "LLM validation failed. Manual review recommended.",
-        "mitigation_steps": ["Perform manual review."],
-        "file_reviews": [],
-        "source": "fallback"
-    }
\ No newline at end of file
+    return _fallback()
+
+
+async def stream_review(context: Dict) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of generate_review. Yields ("file_review", review) as
+    soon as each file review is complete and valid, then ("review", result)
+    with the full validated review (or the fallback). Retries never repeat a
+    file that was already sent.
+    """
+    if context.get("shards"):
+        async for event, data in _review_shards(context):
+            yield event, data
+        return
+
+    prompt = _build_prompt(context)
+    files = context.get("file_names", [])
+
+    cache_key = review_cache.review_key(prompt, MODEL_NAME, GENERATION_CONFIG)
+    cached = await review_cache.get_review(cache_key)
+    if cached is not None:
+        logger.info("LLM review served from cache")
+        cached["cached"] = True
+        for file_review in cached.get("file_reviews", []):
+            yield "file_review", file_review
+        yield "review", cached
+        return
+
+    sent = set()
+
+    retry_budget.deposit()
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        breaker.check()
+
+        try:
+            logger.info(f"Streaming Gemini LLM (attempt {attempt})")
+
+            scanner = _FileReviewScanner()
+            async for text in _stream_content(prompt):
+                for file_review in scanner.feed(text):
+                    file_review = _sanitize_file_review(file_review)
+                    if not _validate_file_review(file_review, files):
+                        logger.warning(f"Dropping invalid streamed file review: {file_review.get('file')}")
+                        continue
+                    if file_review["file"] not in sent:
+                        sent.add(file_review["file"])
+                        yield "file_review", file_review
+
+            result = json.loads(scanner.text)
+            result["source"] = "llm"
+
+            # same per-file rule as the streamed events: invalid file
+            # reviews are dropped instead of failing the whole review
+            result["file_reviews"] = [
+                file_review
+                for file_review in map(_sanitize_file_review, result.get("file_reviews") or [])
+                if _validate_file_review(file_review, files)
+            ]
+
+            if not _validate_structure(result, context):
+                raise ValueError("Structure validation failed")
+
+            logger.info("LLM validated successfully")
+            await review_cache.store_review(cache_key, result)
+            yield "review", result
+            return
+
+        except ClientError as e:
+            if "429" in str(e):
+                logger.error("Quota exceeded")
+                raise
+            logger.warning(f"Client error: {e}")
+
+        except Exception as e:
+            logger.warning(f"Attempt {attempt} failed: {e}")
+
+        if attempt == MAX_RETRIES or not _may_retry():
+            break
+        await asyncio.sleep(2 ** attempt)
+
+    _check_breaker()
+    logger.error("LLM failed after retries")
+
+    yield "review", _fallback()
@@ -1,106 +1,322 @@
-import joblib
-import pandas as pd
+import json
+import logging
+import numpy as np
 from pathlib import Path
 
-from pandas.core.base import NoNewAttributesMixin
+from ml.data.features import transform, transform_one
+from ml.models import registry
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 MODEL_DIR = BASE_DIR / "ml" / "models"
+FOREST_DIR = MODEL_DIR / "rf_forest"
 
-_model = None
-_feature_columns = None
+FOREST_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+TOP_FACTORS = 5
+# forest_predict drops finished slots once fewer than this share are active
+COMPACT_RATIO = 0.85
 
-def _load_model():
-    global _model, _feature_columns
+UNVERSIONED = "unversioned"
 
-    if _model is None:
-        _model = joblib.load(MODEL_DIR / "rf_model.joblib")
-        _feature_columns = joblib.load(MODEL_DIR / "feature_columns.joblib")
+# the active model; replaced as a whole so a reload never mixes versions
+_active = None
+# optional second model scored in shadow or on a slice of traffic
+_challenger = None
 
-def prepare_features(pr_data: dict) -> dict:
+def load_forest(forest_dir: Path = FOREST_DIR, mmap_mode: str | None = None) -> dict:
   """
-  Transform raw PR metadata (from Github API) into the 22 model features.
-  pr_data is the expected raw from Github API
-  """
-  additions = pr_data.get("additions", 0)
-  deletions = pr_data.get("deletions", 0)
-  changed_files = pr_data.get("changed_files", 0)
-  commits_count = pr_data.get("commits_count", 0)
-  body = pr_data.get("body") or ""
-  title = pr_data.get("title", "")
-  labels = pr_data.get("labels") or "none"
-  milestone = pr_data.get("milestone") or "none"
-  file_extensions = pr_data.get("file_extensions") or "none"
-  created_day_of_week = pr_data.get("created_day_of_week", 0)
-  created_hour = pr_data.get("created_hour", 0)
-
-  # author association encoding
-  assoc_map = {
-    "COLLABORATOR": 0, "CONTRIBUTOR": 1, "MEMBER": 2, "NONE": 3, "OWNER": 4
+  Load a flattened forest exported by ml/models/model.py
+  """
+  forest_dir = Path(forest_dir)
+  meta = json.loads((forest_dir / "meta.json").read_text())
+
+  forest = {
+    name: np.load(forest_dir / f"{name}.npy", mmap_mode=mmap_mode)
+    for name in FOREST_ARRAYS
   }
+  forest.update(meta)
+  return forest
 
-  author_assoc_en = assoc_map.get(
-    pr_data.get("author_association", "NONE"), 3
-  )
+def _forest_from_joblib() -> dict:
+  # fallback for models trained before the flattened export existed. Not
+  # memory-mapped: sklearn copies each tree's arrays into its own buffer on
+  # unpickling and flattening copies them again, so every worker holds a
+  # private copy either way
+  import joblib
+  from ml.models.model import flatten_forest
+
+  logger.warning(f"{FOREST_DIR} not found, flattening rf_model.joblib at load time")
+
+  model = joblib.load(MODEL_DIR / "rf_model.joblib")
+  forest = flatten_forest(model)
+  forest["feature_columns"] = joblib.load(MODEL_DIR / "feature_columns.joblib")
+  forest["n_trees"] = len(model.estimators_)
+  return forest
+
+def _read_model(
+  mmap_mode: str | None, version: str | None, registry_dir: Path | None
+) -> dict:
+  registry_dir = Path(registry_dir) if registry_dir else registry.REGISTRY_DIR
+  version = version or registry.current_version(registry_dir)
 
-  total_changes = additions + deletions
-
-  features = {
-    "is_draft": int(pr_data.get("is_draft", False)),
-    "author_account_age_days": pr_data.get("author_account_age_days", 0),
-    "additions": additions,
-    "deletions": deletions,
-    "changed_files": changed_files,
-    "commits_count": commits_count,
-    "body_len": len(body),
-    "created_day_of_week": created_day_of_week,
-    "created_hour": created_hour,
-    "requested_reviewers_count": pr_data.get("requested_reviewers_count", 0),
-    "total_changes": total_changes,
-    "change_ratio": additions / (deletions + 1),
-    "avg_changes_per_file": total_changes / (changed_files + 1),
-    "commits_per_file": commits_count / (changed_files + 1),
-    "title_length": len(title),
-    "is_weekend": int(created_day_of_week >= 5),
-    "is_business_hours": int(9 <= created_hour <= 17),
-    "has_body": int(body != ""),
-    "has_labels": int(labels != "none"),
-    "has_milestone": int(milestone != "none"),
-    "has_file_extensions": int(file_extensions != "none"),
-    "author_association_encoded": author_assoc_en,
+  if version:
+    manifest = registry.verify(version, registry_dir)
+    forest = load_forest(registry.version_dir(version, registry_dir), mmap_mode)
+  elif (FOREST_DIR / "meta.json").exists():
+    manifest, version = {}, UNVERSIONED
+    forest = load_forest(FOREST_DIR, mmap_mode=mmap_mode)
+  else:
+    manifest, version = {}, UNVERSIONED
+    forest = _forest_from_joblib()
+
+  feature_columns = list(forest["feature_columns"])
+  return {
+    "version": version,
+    "manifest": manifest,
+    "forest": forest,
+    "feature_columns": feature_columns,
+    "global_factors": [
+      feature_columns[i]
+      for i in np.argsort(forest["importances"], kind="stable")[::-1]
+    ],
   }
 
-  return features
+def load_model(
+  mmap_mode: str | None = None,
+  version: str | None = None,
+  registry_dir: Path | None = None,
+) -> str:
+    """
+    Load a model and make it the active one. Without a version this is the
+    registry's current version, or the unversioned forest in ml/models when
+    nothing has been published.
+
+    The new model is loaded and warmed up before it replaces the old one, so
+    requests keep being served by the old model until the swap. With
+    mmap_mode="r" the flat .npy node arrays of an exported forest are
+    memory-mapped, so workers share them through the page cache; the
+    rf_model.joblib fallback is always loaded into private memory.
+    """
+    global _active
+
+    model = _read_model(mmap_mode, version, registry_dir)
+    _score(model, np.zeros((1, len(model["feature_columns"]))))
+    _active = model
 
-def predict_risk(pr_features: dict) -> dict:
+    logger.info(f"Model version {model['version']} is active")
+    return model["version"]
+
+def load_challenger(
+  version: str,
+  mmap_mode: str | None = None,
+  registry_dir: Path | None = None,
+) -> str:
   """
-  Takes features and predits risk
+  Load a registry version as the challenger, next to the active model
   """
-  _load_model()
+  global _challenger
+
+  model = _read_model(mmap_mode, version, registry_dir)
+  _score(model, np.zeros((1, len(model["feature_columns"]))))
+  _challenger = model
+
+  logger.info(f"Challenger model version {model['version']} loaded")
+  return model["version"]
+
+def clear_challenger():
+  global _challenger
+  _challenger = None
+
+def challenger_version() -> str | None:
+  return _challenger["version"] if _challenger else None
+
+def _load_model() -> dict:
+    if _active is None:
+        load_model()
+    return _active
+
+def is_loaded() -> bool:
+    return _active is not None
+
+def active_version() -> str | None:
+  return _active["version"] if _active else None
+
+def active_manifest() -> dict:
+  return dict(_active["manifest"]) if _active else {}
+
+def warm_up():
+  """
+  Run one prediction so the first request doesn't pay first-call costs
+  """
+  predict_risk(prepare_features({}))
+
+def forest_predict(forest: dict, X: np.ndarray, contributions: bool = True):
+  """
+  Evaluate the flattened forest on a (n_samples, n_features) matrix.
+
+  Returns the risky-class probability per row, identical to sklearn's
+  predict_proba, and the per-feature tree-path contributions (each row
+  sums to its probability minus the forest's base rate). Callers that
+  only need the probabilities pass contributions=False and get None.
+  """
+  feature = forest["feature"]
+  threshold = forest["threshold"]
+  left = forest["left"]
+  right = forest["right"]
+  value = forest["value"]
+  roots = forest["roots"]
+
+  n_samples, n_features = X.shape
+  n_trees = len(roots)
+
+  # sklearn compares float32 inputs against float64 thresholds
+  X = X.astype(np.float32).astype(np.float64).ravel()
+
+  # one traversal slot per (tree, sample), tree-major so the nodes gathered
+  # together belong to the same tree; offset is the slot's row in X
+  node = np.repeat(roots, n_samples)
+  slot = np.arange(node.size)
+  current = node
+  offset = np.tile(np.arange(n_samples) * n_features, n_trees)
+  current_value = value[current] if contributions else None
+  totals = np.zeros(n_samples * n_features) if contributions else None
+
+  while True:
+    # leaves point to themselves, so a slot on a leaf stays put and adds
+    # nothing; finished slots are only dropped once they are most of the
+    # work, instead of compacting every array on every level
+    current_left = left[current]
+    internal = current_left != current
+    n_internal = np.count_nonzero(internal)
+    if n_internal < COMPACT_RATIO * current.size:
+      node[slot] = current
+      keep = np.flatnonzero(internal)
+      slot, current, offset = slot[keep], current[keep], offset[keep]
+      current_left = current_left[keep]
+      if contributions:
+        current_value = current_value[keep]
+    if not n_internal:
+      break
 
-  df = pd.DataFrame([pr_features])[_feature_columns]
+    index = offset + feature[current]
+    current = np.where(
+      X[index] <= threshold[current], current_left, right[current]
+    )
 
-  prob = _model.predict_proba(df)[0][1]
-  risk_score = float(round(prob * 10, 1))
+    if contributions:
+      next_value = value[current]
+      totals += np.bincount(
+        index, weights=next_value - current_value, minlength=totals.size
+      )
+      current_value = next_value
 
+  # accumulate tree by tree like sklearn so results match bit for bit
+  leaf_values = value[node].reshape(n_trees, n_samples)
+  total = np.zeros(n_samples)
+  for t in range(n_trees):
+    total += leaf_values[t]
+
+  probs = total / n_trees
+  if contributions:
+    totals = totals.reshape(n_samples, n_features) / n_trees
+
+  return probs, totals
+
+def prepare_features(pr_data: dict) -> dict:
+  """
+  Transform raw PR metadata (from Github API) into the 22 model features.
+  Same definitions as training, see ml/data/features.py
+  """
+  return transform_one(pr_data)
+
+def _risk_label(risk_score: float) -> str:
   if risk_score <= 3:
-    risk_label = "LOW"
+    return "LOW"
   elif risk_score <= 6:
-    risk_label = "MEDIUM"
-  else:
-    risk_label = "HIGH"
+    return "MEDIUM"
+  return "HIGH"
+
+def _top_factors(feature_columns: list, contributions: np.ndarray) -> list:
+  """
+  Per row, the features pushing its score up the most, strongest first
+  """
+  order = np.argsort(-contributions, axis=1, kind="stable")[:, :TOP_FACTORS]
+  top = np.take_along_axis(contributions, order, axis=1)
+  return [
+    [feature_columns[i] for i, c in zip(row, values) if c > 0]
+    for row, values in zip(order.tolist(), top.tolist())
+  ]
+
+def global_risk_factors() -> list:
+  """
+  Features ranked by global importance, computed once at load time
+  """
+  return list(_load_model()["global_factors"])
+
+def _score(model: dict, matrix: np.ndarray, factors: bool = True) -> list:
+  probs, contributions = forest_predict(model["forest"], matrix, factors)
+
+  results = []
 
-  # top factors 
-  importances = sorted(
-    zip(_feature_columns, _model.feature_importances_),
-    key = lambda x:x[1],
-    reverse = True
+  for prob in probs:
+    risk_score = float(round(prob * 10, 1))
+    results.append({
+      "risk_score": risk_score,
+      "risk_label": _risk_label(risk_score),
+      "model_version": model["version"],
+    })
+
+  if factors:
+    top = _top_factors(model["feature_columns"], contributions)
+    for result, row in zip(results, top):
+      result["top_risk_factors"] = row
+
+  return results
+
+def _pick_model(challenger: bool) -> dict:
+  if not challenger:
+    return _load_model()
+  if _challenger is None:
+    raise RuntimeError("No challenger model loaded")
+  return _challenger
+
+def predict_risk_batch(
+  features_list: list, challenger: bool = False, factors: bool = True
+) -> list:
+  """
+  Score many PRs at once: one feature matrix, one pass over the forest.
+  With factors=False the tree-path contributions are skipped and results
+  have no top_risk_factors.
+  """
+  model = _pick_model(challenger)
+
+  if not features_list:
+    return []
+
+  matrix = np.array(
+    [[features[c] for c in model["feature_columns"]] for features in features_list],
+    dtype=np.float64,
   )
+  return _score(model, matrix, factors)
 
-  top_factors = [ n for n, _ in importances[:5]] # because we need top 5
+def predict_risk_raw_batch(pr_data_list: list) -> list:
+  """
+  Like predict_risk_batch, but from raw PR metadata: features are built by
+  the vectorized pipeline instead of row by row
+  """
+  model = _load_model()
 
-  return {
-    "risk_score": float(risk_score), 
-    "risk_label": risk_label,
-    "top_risk_factors": top_factors
-  }
\ No newline at end of file
+  if not pr_data_list:
+    return []
+
+  import pandas as pd
+
+  features = transform(pd.DataFrame(pr_data_list))
+  return _score(model, features[model["feature_columns"]].to_numpy(dtype=np.float64))
+
+def predict_risk(pr_features: dict, challenger: bool = False) -> dict:
+  """
+  Takes features and predits risk
+  """
+  return predict_risk_batch([pr_features], challenger)[0]
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Protocol
+
+from backend.app.core import metrics
+from backend.app.core.cache import MemoryCache, SQLiteCache
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    async def aget(self, key: str) -> bytes | None: ...
+
+    async def aset(self, key: str, value: bytes) -> None: ...
+
+
+_backend: CacheBackend | None = None
+_configured = False
+
+
+def _default_backend() -> CacheBackend | None:
+    kind = settings.LLM_CACHE_BACKEND.lower()
+    ttl = settings.LLM_CACHE_TTL_SECONDS
+
+    if kind == "memory":
+        return MemoryCache(max_bytes=settings.LLM_CACHE_MAX_BYTES, ttl=ttl)
+    if kind == "sqlite":
+        return SQLiteCache(
+            settings.LLM_CACHE_PATH,
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            ttl=ttl,
+        )
+    if kind != "none":
+        logger.warning(f"Unknown LLM_CACHE_BACKEND '{kind}', review cache disabled")
+    return None
+
+
+def get_backend() -> CacheBackend | None:
+    global _backend, _configured
+
+    if not _configured:
+        _backend = _default_backend()
+        _configured = True
+    return _backend
+
+
+def set_backend(backend: CacheBackend | None) -> None:
+    """Plug in a different cache backend (or None to disable caching)."""
+    global _backend, _configured
+
+    _backend = backend
+    _configured = True
+
+
+def review_key(prompt: str, model: str, config: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"model": model, "config": config, "prompt": prompt},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_review(key: str) -> Dict[str, Any] | None:
+    backend = get_backend()
+    if backend is None:
+        return None
+
+    value = await backend.aget(key)
+    if value is None:
+        metrics.increment("llm.cache.miss")
+        return None
+
+    metrics.increment("llm.cache.hit")
+    return json.loads(value)
+
+
+async def store_review(key: str, review: Dict[str, Any]) -> None:
+    backend = get_backend()
+    if backend is None:
+        return
+
+    await backend.aset(key, json.dumps(review).encode("utf-8"))
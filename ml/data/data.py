@@ -3,7 +3,9 @@ import time
 
 import dotenv
 import pandas as pd
-from github import Auth, Github, RateLimitExceededException
+from github import Github, RateLimitExceededException
+
+from ml.data.token_pool import TokenPoolError, pool_from_env
 
 dotenv.load_dotenv()
 
@@ -12,7 +14,7 @@ OUTPUT_FILE = "data/raw/multi_repo_data.csv"
 PR_LIMIT_PER_REPO = 150
 MAX_FILES_CHECK = 50
 
-# List of repositories to mine
+# List of repositories to mine (duplicates are dropped below)
 TARGET_REPOS = [
     "pallets/flask",
     "django/django",
@@ -123,6 +125,7 @@ TARGET_REPOS = [
     "elixir-lang/elixir",
     "NousResearch/atropos",
 ]
+TARGET_REPOS = list(dict.fromkeys(TARGET_REPOS))
 
 
 def get_pr_features(pr, repo_name):
@@ -207,7 +210,8 @@ def get_pr_features(pr, repo_name):
 
 def handle_rate_limit(g):
     """
-    Checks rate limit and sleeps if necessary
+    Checks rate limit and sleeps until the reset when nearly out, instead
+    of running into RateLimitExceededException
     """
     rate_limit = g.get_rate_limit().resources.core
     remaining = rate_limit.remaining
@@ -216,15 +220,28 @@ def handle_rate_limit(g):
         print(f"API Calls Remaining: {remaining}")
 
     if remaining < 100:
-        print(f"API Calls Remaining: {remaining}")
+        delay = max(rate_limit.reset.timestamp() - time.time(), 0) + 1
+        print(f"API Calls Remaining: {remaining}, sleeping {delay:.0f}s")
+        time.sleep(delay)
+
+
+def pick_client(clients):
+    """
+    One Github client per pooled credential; each repository is mined with
+    the one that has the most core requests left
+    """
+    return max(clients, key=lambda g: g.get_rate_limit().resources.core.remaining)
 
 
 def main():
-    if TOKEN is not None:
-        auth = Auth.Token(TOKEN)
-        g = Github(auth=auth)
-    else:
+    try:
+        pool = pool_from_env()
+    except TokenPoolError:
         print("invalid token")
+        return
+
+    clients = [Github(auth=c.pygithub_auth()) for c in pool.credentials]
+    print(f"Mining with {len(clients)} GitHub credential(s)")
 
     total_collected = 0
 
@@ -232,6 +249,7 @@ def main():
         print(f"Starting Repository: {repo_name}")
 
         try:
+            g = pick_client(clients)
             repo = g.get_repo(repo_name)
             pulls = repo.get_pulls(state="closed", sort="created", direction="desc")
 
@@ -0,0 +1,219 @@
+"""
+Partitioned Parquet store for mined PRs.
+
+Layout (hive partitioning, one directory per repository and collection day):
+
+    data/dataset/repo=pallets__flask/collected=2025-01-31/part-<uuid>.parquet
+
+Appends are incremental (new files only), enforce SCHEMA and drop rows whose
+(repo_name, pr_number) is already stored. Reads are column-projected and
+memory-mapped, so training only touches the columns it needs.
+
+    python -m ml.data.dataset_store import-csv data/raw/multi_repo_data.csv
+    python -m ml.data.dataset_store convert-processed
+"""
+
+import argparse
+import uuid
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+DATASET_DIR = "data/dataset"
+PROCESSED_DIR = Path(__file__).resolve().parent / "processed"
+KEY_COLUMNS = ["repo_name", "pr_number"]
+PARTITION_SCHEMA = pa.schema([("repo", pa.string()), ("collected", pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+SCHEMA = pa.schema([
+    ("repo_name", pa.string()),
+    ("pr_number", pa.int64()),
+    ("html_url", pa.string()),
+    ("state", pa.string()),
+    ("is_draft", pa.bool_()),
+    ("merged", pa.bool_()),
+    ("title", pa.string()),
+    ("body", pa.string()),
+    ("author_association", pa.string()),
+    ("author_account_age_days", pa.int64()),
+    ("additions", pa.int64()),
+    ("deletions", pa.int64()),
+    ("changed_files", pa.int64()),
+    ("commits_count", pa.int64()),
+    ("body_len", pa.int64()),
+    ("created_day_of_week", pa.int64()),
+    ("created_hour", pa.int64()),
+    ("hours_to_merge", pa.float64()),
+    ("review_comments_count", pa.int64()),
+    ("issue_comments_count", pa.int64()),
+    ("requested_reviewers_count", pa.int64()),
+    ("labels", pa.string()),
+    ("milestone", pa.string()),
+    ("head_branch", pa.string()),
+    ("base_branch", pa.string()),
+    ("file_extensions", pa.string()),
+])
+
+
+def _partition_value(repo_name: str) -> str:
+    return repo_name.replace("/", "__")
+
+
+class DatasetStore:
+    def __init__(self, root: str | Path = DATASET_DIR, schema: pa.Schema = SCHEMA):
+        self.root = Path(root)
+        self.schema = schema
+        self._fs = fs.LocalFileSystem(use_mmap=True)
+
+    def _dataset(self) -> ds.Dataset | None:
+        if not self.root.exists() or not any(self.root.rglob("*.parquet")):
+            return None
+
+        return ds.dataset(
+            str(self.root),
+            schema=pa.unify_schemas([self.schema, PARTITION_SCHEMA]),
+            format="parquet",
+            partitioning=PARTITIONING,
+            filesystem=self._fs,
+        )
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        missing = [name for name in self.schema.names if name not in df.columns]
+        if missing:
+            raise ValueError(f"Rows are missing columns: {missing}")
+
+        # raises if a column can't be converted to its declared type
+        return pa.Table.from_pandas(
+            df[self.schema.names], schema=self.schema, preserve_index=False
+        )
+
+    def existing_keys(self, repo_names: list[str]) -> set[tuple[str, int]]:
+        dataset = self._dataset()
+        if dataset is None:
+            return set()
+
+        table = dataset.to_table(
+            columns=KEY_COLUMNS,
+            filter=pc.field("repo").isin([_partition_value(r) for r in repo_names]),
+        )
+        return set(zip(table["repo_name"].to_pylist(), table["pr_number"].to_pylist()))
+
+    def append(self, df: pd.DataFrame, collected: date | None = None) -> int:
+        """
+        Append rows as new Parquet files, skipping already-stored PRs.
+        Returns the number of rows written.
+        """
+        if df.empty:
+            return 0
+
+        df = df.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+        known = self.existing_keys(df["repo_name"].unique().tolist())
+        if known:
+            keys = list(zip(df["repo_name"], df["pr_number"]))
+            df = df[[key not in known for key in keys]]
+        if df.empty:
+            return 0
+
+        collected = (collected or date.today()).isoformat()
+
+        # convert everything first so a schema error writes nothing
+        tables = [
+            (repo_name, self._to_table(rows))
+            for repo_name, rows in df.groupby("repo_name", sort=False)
+        ]
+
+        for repo_name, table in tables:
+            directory = (
+                self.root
+                / f"repo={_partition_value(repo_name)}"
+                / f"collected={collected}"
+            )
+            directory.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, directory / f"part-{uuid.uuid4().hex}.parquet")
+
+        return sum(table.num_rows for _, table in tables)
+
+    def load(
+        self,
+        columns: list[str] | None = None,
+        repos: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """Load stored rows, reading only the requested columns and repos."""
+        dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=columns or self.schema.names)
+
+        expression = None
+        if repos:
+            expression = pc.field("repo").isin([_partition_value(r) for r in repos])
+
+        table = dataset.to_table(
+            columns=columns or self.schema.names,
+            filter=expression,
+        )
+        return table.to_pandas()
+
+    def import_csv(self, csv_path: str | Path) -> int:
+        df = pd.read_csv(csv_path)
+        df["is_draft"] = df["is_draft"].astype(bool)
+        df["merged"] = df["merged"].astype(bool)
+        for column in ("body", "labels", "milestone", "file_extensions"):
+            df[column] = df[column].astype("string")
+        return self.append(df)
+
+
+def write_processed(df: pd.DataFrame, path: str | Path) -> Path:
+    """Write the processed (feature) table as a single Parquet file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+    return path
+
+
+def load_processed(
+    path: str | Path = PROCESSED_DIR / "processed_data.parquet",
+    columns: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Load the processed table, reading only the requested columns. Falls back
+    to the CSV next to it when no Parquet file has been written yet.
+    """
+    path = Path(path)
+    if path.exists():
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    return pd.read_csv(path.with_suffix(".csv"), usecols=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the Parquet PR dataset")
+    parser.add_argument("--root", default=DATASET_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import-csv", help="Import a mined CSV file")
+    import_cmd.add_argument("csv_path")
+    convert_cmd = sub.add_parser(
+        "convert-processed", help="Convert processed_data.csv to Parquet"
+    )
+    convert_cmd.add_argument(
+        "csv_path", nargs="?", default=str(PROCESSED_DIR / "processed_data.csv")
+    )
+    args = parser.parse_args()
+
+    if args.command == "import-csv":
+        store = DatasetStore(args.root)
+        written = store.import_csv(args.csv_path)
+        print(f"Imported {written} new rows into {store.root}")
+    elif args.command == "convert-processed":
+        csv_path = Path(args.csv_path)
+        path = write_processed(pd.read_csv(csv_path), csv_path.with_suffix(".parquet"))
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Feature pipeline shared by training, batch scoring and online serving.
+
+Raw PR columns (as mined by data.py / miner.py, or built from the GitHub API
+by the backend) are turned into the model's 22 features here and nowhere
+else:
+
+    transform(df)        vectorized, for training and batch scoring
+    transform_one(dict)  single-row fast path for online requests
+
+Numeric features are defined once in DERIVED and evaluated by both paths;
+check_parity verifies the two paths agree exactly.
+
+    python -m ml.data.features build   # dataset store -> processed_data.parquet
+    python -m ml.data.features check   # online/offline parity check
+"""
+
+import argparse
+import math
+import sys
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+# pandas (and the dataset store, which pulls in pyarrow) are only imported
+# by the batch and CLI paths, so online serving through transform_one
+# never loads them
+if TYPE_CHECKING:
+    import pandas as pd
+
+# LabelEncoder order of the training data; unseen values map to NONE
+ASSOC_MAP = {
+    "COLLABORATOR": 0, "CONTRIBUTOR": 1, "MEMBER": 2, "NONE": 3, "OWNER": 4
+}
+UNKNOWN_ASSOC = ASSOC_MAP["NONE"]
+
+NUMERIC_COLUMNS = [
+    "author_account_age_days", "additions", "deletions", "changed_files",
+    "commits_count", "created_day_of_week", "created_hour",
+    "requested_reviewers_count",
+]
+# missing or empty text falls back to these
+TEXT_DEFAULTS = {
+    "body": "",
+    "title": "",
+    "labels": "none",
+    "milestone": "none",
+    "file_extensions": "none",
+}
+RAW_COLUMNS = ["is_draft", *NUMERIC_COLUMNS, *TEXT_DEFAULTS, "author_association"]
+TARGET_COLUMNS = ["hours_to_merge", "review_comments_count", "issue_comments_count"]
+
+# evaluated on scalars (online) and on arrays (batch) alike
+DERIVED = {
+    "total_changes": lambda f: f["additions"] + f["deletions"],
+    "change_ratio": lambda f: f["additions"] / (f["deletions"] + 1),
+    "avg_changes_per_file": lambda f: f["total_changes"] / (f["changed_files"] + 1),
+    "commits_per_file": lambda f: f["commits_count"] / (f["changed_files"] + 1),
+    "is_weekend": lambda f: f["created_day_of_week"] >= 5,
+    "is_business_hours": lambda f: (f["created_hour"] >= 9) & (f["created_hour"] <= 17),
+}
+
+FEATURE_COLUMNS = [
+    "is_draft", "author_account_age_days", "additions", "deletions",
+    "changed_files", "commits_count", "body_len", "created_day_of_week",
+    "created_hour", "requested_reviewers_count", "total_changes",
+    "change_ratio", "avg_changes_per_file", "commits_per_file",
+    "title_length", "is_weekend", "is_business_hours", "has_body",
+    "has_labels", "has_milestone", "has_file_extensions",
+    "author_association_encoded",
+]
+FLOAT_FEATURES = {"change_ratio", "avg_changes_per_file", "commits_per_file"}
+
+
+def _missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _base_one(pr_data: dict) -> dict:
+    f = {}
+    for column in NUMERIC_COLUMNS:
+        value = pr_data.get(column)
+        f[column] = 0 if _missing(value) else value
+
+    text = {}
+    for column, default in TEXT_DEFAULTS.items():
+        value = pr_data.get(column)
+        text[column] = default if _missing(value) or value == "" else str(value)
+
+    is_draft = pr_data.get("is_draft")
+    f["is_draft"] = False if _missing(is_draft) else bool(is_draft)
+    f["body_len"] = len(text["body"])
+    f["title_length"] = len(text["title"])
+    f["has_body"] = text["body"] != ""
+    f["has_labels"] = text["labels"] != "none"
+    f["has_milestone"] = text["milestone"] != "none"
+    f["has_file_extensions"] = text["file_extensions"] != "none"
+    f["author_association_encoded"] = ASSOC_MAP.get(
+        pr_data.get("author_association"), UNKNOWN_ASSOC
+    )
+    return f
+
+
+def _base_frame(df: "pd.DataFrame") -> dict:
+    import pandas as pd
+
+    n = len(df)
+    f = {}
+    for column in NUMERIC_COLUMNS:
+        if column in df:
+            f[column] = pd.to_numeric(df[column]).fillna(0).to_numpy()
+        else:
+            f[column] = np.zeros(n, dtype=np.int64)
+
+    text = {}
+    for column, default in TEXT_DEFAULTS.items():
+        if column in df:
+            values = df[column]
+            text[column] = values.where(values.notna() & (values != ""), default).astype(str)
+        else:
+            text[column] = pd.Series([default] * n, index=df.index)
+
+    if "is_draft" in df:
+        f["is_draft"] = df["is_draft"].fillna(False).astype(bool).to_numpy()
+    else:
+        f["is_draft"] = np.zeros(n, dtype=bool)
+    f["body_len"] = text["body"].str.len().to_numpy()
+    f["title_length"] = text["title"].str.len().to_numpy()
+    f["has_body"] = (text["body"] != "").to_numpy()
+    f["has_labels"] = (text["labels"] != "none").to_numpy()
+    f["has_milestone"] = (text["milestone"] != "none").to_numpy()
+    f["has_file_extensions"] = (text["file_extensions"] != "none").to_numpy()
+
+    if "author_association" in df:
+        assoc = df["author_association"].map(ASSOC_MAP).fillna(UNKNOWN_ASSOC)
+        f["author_association_encoded"] = assoc.to_numpy()
+    else:
+        f["author_association_encoded"] = np.full(n, UNKNOWN_ASSOC)
+    return f
+
+
+def transform_one(pr_data: dict) -> dict:
+    """
+    Features for a single PR, from a dict of raw columns
+    """
+    f = _base_one(pr_data)
+    for name, derive in DERIVED.items():
+        f[name] = derive(f)
+
+    return {
+        name: float(f[name]) if name in FLOAT_FEATURES else int(f[name])
+        for name in FEATURE_COLUMNS
+    }
+
+
+def transform(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Features for every row of a DataFrame of raw columns, in FEATURE_COLUMNS
+    order
+    """
+    import pandas as pd
+
+    f = _base_frame(df)
+    for name, derive in DERIVED.items():
+        f[name] = derive(f)
+
+    return pd.DataFrame(
+        {
+            name: np.asarray(f[name]).astype(
+                np.float64 if name in FLOAT_FEATURES else np.int64
+            )
+            for name in FEATURE_COLUMNS
+        },
+        index=df.index,
+    )
+
+
+def risk_target(df: "pd.DataFrame") -> "pd.Series":
+    """
+    is_risky: slow to merge (top quartile, ~3 days) or heavily discussed
+    """
+    return (
+        (df["hours_to_merge"] > 70)
+        | (df["review_comments_count"] >= 3)
+        | (df["issue_comments_count"] >= 5)
+    ).astype(int)
+
+
+def build_processed(raw: "pd.DataFrame") -> "pd.DataFrame":
+    processed = transform(raw)
+    processed["is_risky"] = risk_target(raw)
+    return processed
+
+
+EDGE_CASES = [
+    {},
+    {"body": None, "title": None, "labels": "", "milestone": None},
+    {"author_association": "FIRST_TIME_CONTRIBUTOR", "is_draft": None},
+    {"additions": 10, "deletions": 0, "changed_files": 0, "commits_count": 3},
+    {"created_day_of_week": 6, "created_hour": 17, "body": "x" * 5000},
+    {"created_day_of_week": 4, "created_hour": 9, "title": "12345"},
+]
+
+
+def check_parity(raw: "pd.DataFrame") -> int:
+    """
+    Compare transform and transform_one on every row (plus EDGE_CASES).
+    Prints each mismatching feature and returns the number of bad rows.
+    """
+    import pandas as pd
+
+    raw = pd.concat([raw, pd.DataFrame(EDGE_CASES)], ignore_index=True)
+    batch = transform(raw)
+    online = pd.DataFrame(
+        [transform_one(row) for row in raw.to_dict("records")],
+        index=raw.index,
+    )
+
+    bad_rows = np.zeros(len(raw), dtype=bool)
+    for name in FEATURE_COLUMNS:
+        differs = batch[name].to_numpy() != online[name].to_numpy()
+        if differs.any():
+            print(f"{name}: {int(differs.sum())} rows differ")
+            bad_rows |= differs
+
+    return int(bad_rows.sum())
+
+
+def _load_raw(args) -> "pd.DataFrame":
+    import pandas as pd
+
+    from ml.data.dataset_store import DatasetStore
+
+    if args.csv:
+        return pd.read_csv(args.csv)
+    return DatasetStore(args.root).load(columns=RAW_COLUMNS + TARGET_COLUMNS)
+
+
+def main():
+    from ml.data.dataset_store import DATASET_DIR, PROCESSED_DIR, write_processed
+
+    parser = argparse.ArgumentParser(description="PR feature pipeline")
+    parser.add_argument("--root", default=DATASET_DIR)
+    parser.add_argument("--csv", help="read raw rows from a CSV instead of the store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="Write the processed training table")
+    build_cmd.add_argument(
+        "--out", default=str(PROCESSED_DIR / "processed_data.parquet")
+    )
+    sub.add_parser("check", help="Check online and batch features agree")
+    args = parser.parse_args()
+
+    raw = _load_raw(args)
+
+    if args.command == "build":
+        path = write_processed(build_processed(raw), args.out)
+        print(f"Wrote {len(raw)} rows to {path}")
+    elif args.command == "check":
+        bad = check_parity(raw)
+        print(f"Checked {len(raw) + len(EDGE_CASES)} rows, {bad} mismatched")
+        sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+GraphQL bulk collector for training data.
+
+Pulls up to 100 merged PRs per query with everything data.py needs (author
+account age, labels, milestone, reviewers, sizes, file paths), instead of
+roughly five REST calls per PR. Produces the same columns as the REST
+miner and reuses its checkpoints, so runs are resumable.
+
+    python -m ml.data.graphql_collector --limit 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+from ml.data.data import MAX_FILES_CHECK, TARGET_REPOS
+from ml.data.dataset_store import DATASET_DIR
+from ml.data.miner import CHECKPOINT_DIR, Checkpoint, Miner, pr_features_from_json
+
+PAGE_SIZE = 100
+MIN_PAGE_SIZE = 10
+THREADS_CHECK = 50
+GROW_AFTER = 5
+POINTS_RESERVE = 100
+
+PULL_REQUESTS_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String,
+      $files: Int!, $threads: Int!) {
+  rateLimit { cost remaining resetAt }
+  repository(owner: $owner, name: $name) {
+    pullRequests(states: MERGED, first: $first, after: $after,
+                 orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        number
+        url
+        state
+        isDraft
+        title
+        body
+        createdAt
+        mergedAt
+        authorAssociation
+        author { ... on User { createdAt } }
+        additions
+        deletions
+        changedFiles
+        commits { totalCount }
+        comments { totalCount }
+        reviewThreads(first: $threads) { nodes { comments { totalCount } } }
+        reviewRequests { totalCount }
+        labels(first: 20) { nodes { name } }
+        milestone { title }
+        headRefName
+        baseRefName
+        files(first: $files) { nodes { path } }
+      }
+    }
+  }
+}
+"""
+
+
+class QueryTooExpensive(Exception):
+    pass
+
+
+def _to_rest_shape(node: dict) -> tuple[dict, dict | None, list[dict]]:
+    """
+    Map a GraphQL PR node onto the REST payload shape used by
+    pr_features_from_json, so both collectors share one feature definition.
+
+    review_comments is the sum over the first THREADS_CHECK review threads.
+    """
+    pr = {
+        "number": node["number"],
+        "html_url": node["url"],
+        "state": "open" if node["state"] == "OPEN" else "closed",
+        "draft": node["isDraft"],
+        "merged": True,
+        "title": node["title"],
+        "body": node["body"] or None,
+        "created_at": node["createdAt"],
+        "merged_at": node["mergedAt"],
+        "author_association": node["authorAssociation"],
+        "additions": node["additions"],
+        "deletions": node["deletions"],
+        "changed_files": node["changedFiles"],
+        "commits": node["commits"]["totalCount"],
+        "comments": node["comments"]["totalCount"],
+        "review_comments": sum(
+            thread["comments"]["totalCount"]
+            for thread in node["reviewThreads"]["nodes"]
+        ),
+        "requested_reviewers": [None] * node["reviewRequests"]["totalCount"],
+        "labels": node["labels"]["nodes"],
+        "milestone": node["milestone"],
+        "head": {"ref": node["headRefName"]},
+        "base": {"ref": node["baseRefName"]},
+    }
+    author = node.get("author") or {}
+    user = {"created_at": author["createdAt"]} if author.get("createdAt") else None
+    files = [{"filename": f["path"]} for f in (node["files"] or {}).get("nodes", [])]
+
+    return pr, user, files
+
+
+class GraphQLCollector(Miner):
+    """
+    Cost-aware sizing: each page asks for no more PRs than the points the
+    best pooled credential has left above the reserve pay for, at the cost
+    per PR (rateLimit.cost / first) of the last page. Separately, the page
+    size halves whenever GitHub rejects a query as too expensive or times
+    out, and doubles again after GROW_AFTER successful pages in a row.
+    Each query goes out on the pooled credential with the most GraphQL
+    points left; the pool pauses until resetAt once every token is down to
+    its reserve.
+    """
+
+    rate_limit_reserve = POINTS_RESERVE
+
+    def __init__(self, *args, page_size: int = PAGE_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_size = page_size
+        self.successes = 0
+        self.last_cost = 1
+        self.cost_per_pr: float | None = None
+
+    async def query(self, variables: dict) -> dict:
+        credential = await self.pool.acquire("graphql")
+
+        response = None
+        try:
+            response = await self.client.post(
+                "/graphql",
+                json={"query": PULL_REQUESTS_QUERY, "variables": variables},
+                headers=await self.pool.auth_headers(credential, self.client),
+            )
+        finally:
+            self.pool.release(credential, response)
+
+        if response.status_code in (502, 504):
+            raise QueryTooExpensive(f"HTTP {response.status_code}")
+        response.raise_for_status()
+
+        payload = response.json()
+        errors = payload.get("errors") or []
+        if any(e.get("type") in ("MAX_NODE_LIMIT_EXCEEDED", "RESOURCE_LIMITS_EXCEEDED") for e in errors):
+            raise QueryTooExpensive(errors[0].get("message"))
+        if errors:
+            raise RuntimeError(errors[0].get("message"))
+
+        self.last_cost = payload["data"]["rateLimit"]["cost"]
+        self.cost_per_pr = self.last_cost / variables["first"]
+
+        return payload["data"]["repository"]["pullRequests"]
+
+    def affordable(self) -> int:
+        """
+        PRs the next page can ask for on the points left above the reserve
+        """
+        credential = self.pool.best("graphql")
+        if credential is None or self.cost_per_pr is None:
+            return PAGE_SIZE
+
+        limit = credential.limit("graphql")
+        if limit.remaining is None or time.time() >= limit.reset_at:
+            return PAGE_SIZE
+        return max(int((limit.remaining - self.pool.reserve) / self.cost_per_pr), 1)
+
+    async def mine_repo(self, repo_name: str) -> int:
+        checkpoint = Checkpoint(self.checkpoint_dir, repo_name)
+        if checkpoint.state["done"]:
+            print(f"Skipping {repo_name}: already complete")
+            return 0
+
+        owner, name = repo_name.split("/")
+
+        async with self.repo_slots:
+            cursor = checkpoint.state.get("cursor")
+            collected = checkpoint.state["collected"]
+            print(f"Starting Repository: {repo_name} ({collected} rows)")
+
+            while collected < self.pr_limit:
+                first = min(
+                    self.page_size, self.pr_limit - collected, self.affordable()
+                )
+                try:
+                    result = await self.query({
+                        "owner": owner,
+                        "name": name,
+                        "first": first,
+                        "after": cursor,
+                        "files": MAX_FILES_CHECK,
+                        "threads": THREADS_CHECK,
+                    })
+                except QueryTooExpensive as e:
+                    if self.page_size <= MIN_PAGE_SIZE:
+                        raise
+                    self.page_size = max(self.page_size // 2, MIN_PAGE_SIZE)
+                    self.successes = 0
+                    print(f"Query too expensive ({e}), page size now {self.page_size}")
+                    continue
+
+                self.successes += 1
+                if self.successes >= GROW_AFTER:
+                    self.page_size = min(self.page_size * 2, PAGE_SIZE)
+                    self.successes = 0
+
+                rows = [
+                    pr_features_from_json(*_to_rest_shape(node), repo_name)
+                    for node in result["nodes"]
+                ]
+                if rows:
+                    await self.append_rows(rows)
+                    collected += len(rows)
+
+                page_info = result["pageInfo"]
+                cursor = page_info["endCursor"]
+                last_page = not page_info["hasNextPage"]
+                checkpoint.save(cursor=cursor, collected=collected, done=last_page)
+                print(f"[{repo_name}] {collected}/{self.pr_limit} rows (cost {self.last_cost})")
+
+                if last_page:
+                    print(f"End of PRs for {repo_name}")
+                    break
+
+            checkpoint.save(done=True)
+            return collected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect merged PRs via GraphQL")
+    parser.add_argument("--repos", nargs="*", default=TARGET_REPOS)
+    parser.add_argument("--output", default=DATASET_DIR)
+    parser.add_argument("--checkpoint-dir", default=f"{CHECKPOINT_DIR}/graphql")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repo-concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    collector = GraphQLCollector(
+        output_file=args.output,
+        checkpoint_dir=args.checkpoint_dir,
+        pr_limit=args.limit,
+        repo_concurrency=args.repo_concurrency,
+    )
+    total = asyncio.run(collector.run(list(dict.fromkeys(args.repos))))
+
+    print(f"\nJob Complete! Total rows collected: {total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Async, resumable PR miner.
+
+Mines the same columns as data.py, but processes repositories concurrently
+over a pool of GitHub credentials (see token_pool.py) and checkpoints each
+repository after every page, so an interrupted crawl resumes where it stopped.
+
+Rows go to the partitioned Parquet store (see dataset_store.py); pass an
+--output ending in .csv to append to a CSV file instead.
+
+    python -m ml.data.miner --repo-concurrency 4 --pr-concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import pandas as pd
+
+from ml.data.data import (
+    MAX_FILES_CHECK,
+    PR_LIMIT_PER_REPO,
+    TARGET_REPOS,
+)
+from ml.data.dataset_store import DATASET_DIR, DatasetStore
+from ml.data.token_pool import (
+    RATE_LIMIT_RESERVE,
+    TokenPool,
+    TokenPoolError,
+    is_rate_limited,
+    pool_from_env,
+)
+
+BASE_URL = "https://api.github.com"
+CHECKPOINT_DIR = "data/raw/checkpoints"
+PER_PAGE = 100
+MAX_ATTEMPTS = 5
+
+COLUMNS = [
+    "repo_name", "pr_number", "html_url", "state", "is_draft", "merged",
+    "title", "body", "author_association", "author_account_age_days",
+    "additions", "deletions", "changed_files", "commits_count", "body_len",
+    "created_day_of_week", "created_hour", "hours_to_merge",
+    "review_comments_count", "issue_comments_count",
+    "requested_reviewers_count", "labels", "milestone", "head_branch",
+    "base_branch", "file_extensions",
+]
+
+
+class Checkpoint:
+    """Per-repository progress file: next page to fetch and rows collected."""
+
+    def __init__(self, directory: str, repo_name: str):
+        self.path = Path(directory) / f"{repo_name.replace('/', '__')}.json"
+        self.state = {"page": 1, "collected": 0, "done": False}
+
+        if self.path.exists():
+            self.state.update(json.loads(self.path.read_text()))
+
+    def save(self, **changes) -> None:
+        self.state.update(changes)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state))
+        os.replace(tmp, self.path)
+
+
+def _parse_time(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def pr_features_from_json(
+    pr: dict, user: dict | None, files: list[dict], repo_name: str
+) -> dict:
+    """
+    Same features as data.get_pr_features, built from REST JSON payloads
+    """
+    created_at = _parse_time(pr["created_at"])
+    merged_at = _parse_time(pr.get("merged_at"))
+    user_created_at = _parse_time((user or {}).get("created_at"))
+    body = pr.get("body")
+
+    extensions = set()
+    for f in files[:MAX_FILES_CHECK]:
+        filename = f["filename"]
+        if "." in filename:
+            extensions.add(filename.split(".")[-1])
+
+    if merged_at:
+        hours_to_merge = round((merged_at - created_at).total_seconds() / 3600, 2)
+    else:
+        hours_to_merge = -1
+
+    return {
+        "repo_name": repo_name,
+        "pr_number": pr["number"],
+        "html_url": pr["html_url"],
+        "state": pr["state"],
+        "is_draft": pr.get("draft", False),
+        "merged": pr.get("merged", merged_at is not None),
+        "title": pr["title"],
+        "body": body,
+        "author_association": pr.get("author_association"),
+        "author_account_age_days": (
+            (created_at - user_created_at).days if user_created_at else 0
+        ),
+        "additions": pr.get("additions", 0),
+        "deletions": pr.get("deletions", 0),
+        "changed_files": pr.get("changed_files", 0),
+        "commits_count": pr.get("commits", 0),
+        "body_len": len(body) if body else 0,
+        "created_day_of_week": created_at.weekday(),
+        "created_hour": created_at.hour,
+        "hours_to_merge": hours_to_merge,
+        "review_comments_count": pr.get("review_comments", 0),
+        "issue_comments_count": pr.get("comments", 0),
+        "requested_reviewers_count": len(pr.get("requested_reviewers") or []),
+        "labels": ", ".join(label["name"] for label in pr.get("labels") or []),
+        "milestone": (pr.get("milestone") or {}).get("title"),
+        "head_branch": pr["head"]["ref"],
+        "base_branch": pr["base"]["ref"],
+        "file_extensions": ", ".join(sorted(extensions)),
+    }
+
+
+class Miner:
+    # requests left untouched on every credential before the pool waits
+    rate_limit_reserve = RATE_LIMIT_RESERVE
+
+    def __init__(
+        self,
+        output_file: str = DATASET_DIR,
+        checkpoint_dir: str = CHECKPOINT_DIR,
+        pr_limit: int = PR_LIMIT_PER_REPO,
+        repo_concurrency: int = 4,
+        pr_concurrency: int = 8,
+    ):
+        self.output_file = output_file
+        self.store = None if output_file.endswith(".csv") else DatasetStore(output_file)
+        self.checkpoint_dir = checkpoint_dir
+        self.pr_limit = pr_limit
+        self.repo_slots = asyncio.Semaphore(repo_concurrency)
+        self.pr_slots = asyncio.Semaphore(pr_concurrency)
+        self.pool: TokenPool | None = None
+        self.write_lock = asyncio.Lock()
+        self.users: dict[str, asyncio.Task] = {}
+        self.client: httpx.AsyncClient | None = None
+
+    async def get(self, path: str, params: dict | None = None) -> httpx.Response:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            # waits for a reset when every credential is down to its reserve
+            credential = await self.pool.acquire()
+
+            response = None
+            try:
+                headers = await self.pool.auth_headers(credential, self.client)
+                response = await self.client.get(path, params=params, headers=headers)
+            except httpx.HTTPError as e:
+                print(f"Request to {path} failed: {e}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            finally:
+                self.pool.release(credential, response)
+
+            if is_rate_limited(response):
+                # the pool has marked this credential; retry on another
+                print(f"Rate limited on {path} ({credential.name}), rerouting")
+                continue
+
+            if response.status_code >= 500:
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            response.raise_for_status()
+            return response
+
+        raise RuntimeError(f"Giving up on {path} after {MAX_ATTEMPTS} attempts")
+
+    async def get_user(self, login: str) -> dict | None:
+        # authors repeat a lot across PRs; fetch each account once
+        if login not in self.users:
+            self.users[login] = asyncio.ensure_future(self.get(f"/users/{login}"))
+
+        try:
+            return (await self.users[login]).json()
+        except Exception:
+            return None
+
+    async def mine_pr(self, summary: dict, repo_name: str) -> dict | None:
+        async with self.pr_slots:
+            number = summary["number"]
+            try:
+                pr, files = await asyncio.gather(
+                    self.get(f"/repos/{repo_name}/pulls/{number}"),
+                    self.get(
+                        f"/repos/{repo_name}/pulls/{number}/files",
+                        params={"per_page": MAX_FILES_CHECK},
+                    ),
+                )
+                pr = pr.json()
+                user = await self.get_user(pr["user"]["login"]) if pr.get("user") else None
+                return pr_features_from_json(pr, user, files.json(), repo_name)
+            except Exception as e:
+                if "404" not in str(e):
+                    print(f"Skipping PR #{number} due to error: {e}")
+                return None
+
+    async def append_rows(self, rows: list[dict]) -> None:
+        async with self.write_lock:
+            df = pd.DataFrame(rows, columns=COLUMNS)
+            if self.store is not None:
+                await asyncio.to_thread(self.store.append, df)
+                return
+
+            header_mode = not os.path.exists(self.output_file)
+            Path(self.output_file).parent.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(
+                df.to_csv, self.output_file, mode="a", header=header_mode, index=False
+            )
+
+    async def mine_repo(self, repo_name: str) -> int:
+        checkpoint = Checkpoint(self.checkpoint_dir, repo_name)
+        if checkpoint.state["done"]:
+            print(f"Skipping {repo_name}: already complete")
+            return 0
+
+        async with self.repo_slots:
+            page = checkpoint.state["page"]
+            collected = checkpoint.state["collected"]
+            print(f"Starting Repository: {repo_name} (page {page}, {collected} rows)")
+
+            while collected < self.pr_limit:
+                response = await self.get(
+                    f"/repos/{repo_name}/pulls",
+                    params={
+                        "state": "closed",
+                        "sort": "created",
+                        "direction": "desc",
+                        "per_page": PER_PAGE,
+                        "page": page,
+                    },
+                )
+                summaries = [pr for pr in response.json() if pr.get("merged_at")]
+                summaries = summaries[:self.pr_limit - collected]
+
+                rows = await asyncio.gather(
+                    *(self.mine_pr(pr, repo_name) for pr in summaries)
+                )
+                rows = [row for row in rows if row is not None]
+
+                if rows:
+                    await self.append_rows(rows)
+                    collected += len(rows)
+
+                last_page = "next" not in response.links
+                page += 1
+                checkpoint.save(page=page, collected=collected, done=last_page)
+                print(f"[{repo_name}] {collected}/{self.pr_limit} rows")
+
+                if last_page:
+                    print(f"End of PRs for {repo_name}")
+                    break
+
+            checkpoint.save(done=True)
+            return collected
+
+    async def run(self, repos: list[str]) -> int:
+        try:
+            self.pool = pool_from_env(self.rate_limit_reserve)
+        except TokenPoolError as e:
+            print(f"invalid token: {e}")
+            return 0
+        print(f"Mining with {len(self.pool)} GitHub credential(s)")
+
+        headers = {"Accept": "application/vnd.github+json"}
+
+        async with httpx.AsyncClient(
+            base_url=BASE_URL, headers=headers, timeout=30.0
+        ) as client:
+            self.client = client
+
+            async def safe_mine(repo_name: str) -> int:
+                try:
+                    return await self.mine_repo(repo_name)
+                except Exception as e:
+                    print(f"Failed to process repo {repo_name}: {e}")
+                    return 0
+
+            counts = await asyncio.gather(*(safe_mine(r) for r in repos))
+
+        return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine merged PRs concurrently")
+    parser.add_argument("--repos", nargs="*", default=TARGET_REPOS)
+    parser.add_argument("--output", default=DATASET_DIR)
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--limit", type=int, default=PR_LIMIT_PER_REPO)
+    parser.add_argument("--repo-concurrency", type=int, default=4)
+    parser.add_argument("--pr-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    miner = Miner(
+        output_file=args.output,
+        checkpoint_dir=args.checkpoint_dir,
+        pr_limit=args.limit,
+        repo_concurrency=args.repo_concurrency,
+        pr_concurrency=args.pr_concurrency,
+    )
+    repos = list(dict.fromkeys(args.repos))
+    total = asyncio.run(miner.run(repos))
+
+    print(f"\nJob Complete! Total rows collected: {total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Pool of GitHub credentials with rate-limit-aware routing.
+
+Credentials are personal access tokens and/or GitHub App installations
+(installation tokens are minted from the app's private key and refreshed
+before they expire; this needs the optional PyJWT package). Every response
+updates the credential's view of its rate limit, per resource ("core",
+"graphql", "search", ...), from X-RateLimit-Remaining / -Reset and, for
+secondary limits, Retry-After.
+
+acquire() hands out the credential with the most requests left. When every
+credential is down to its reserve or blocked, it waits for the earliest
+reset instead of letting the request hit a 403, or raises
+RateLimitExhausted if that wait would be longer than max_wait.
+
+    pool = pool_from_env()
+    credential = await pool.acquire()
+    headers = await pool.auth_headers(credential, client)
+    response = await client.get(url, headers=headers)
+    pool.release(credential, response)
+
+Configured from GITHUB_TOKEN, GITHUB_TOKENS (comma separated) and
+GITHUB_APP_ID / GITHUB_APP_PRIVATE_KEY_PATH / GITHUB_APP_INSTALLATION_IDS.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.github.com"
+RATE_LIMIT_RESERVE = 50
+# installation tokens live an hour; refresh with this much left
+TOKEN_REFRESH_MARGIN = 5 * 60
+
+
+class TokenPoolError(Exception):
+    pass
+
+
+class RateLimitExhausted(TokenPoolError):
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"All GitHub credentials are rate limited for {retry_after:.0f}s")
+
+
+class _Limit:
+    """Rate-limit state of one credential for one resource."""
+
+    def __init__(self):
+        self.remaining: int | None = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+
+class Credential:
+    kind = "token"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limits: dict[str, _Limit] = {}
+
+    def limit(self, resource: str) -> _Limit:
+        return self.limits.setdefault(resource, _Limit())
+
+    async def token(self, client: httpx.AsyncClient) -> str:
+        raise NotImplementedError
+
+    def pygithub_auth(self):
+        """Equivalent PyGithub auth, for the synchronous miner."""
+        raise NotImplementedError
+
+
+class TokenCredential(Credential):
+    def __init__(self, token: str, name: str):
+        super().__init__(name)
+        self._token = token
+
+    async def token(self, client: httpx.AsyncClient) -> str:
+        return self._token
+
+    def pygithub_auth(self):
+        from github import Auth
+
+        return Auth.Token(self._token)
+
+
+class AppCredential(Credential):
+    kind = "app"
+
+    def __init__(self, app_id: str, private_key: str, installation_id: str):
+        super().__init__(f"app {app_id}/{installation_id}")
+        self.app_id = app_id
+        self.private_key = private_key
+        self.installation_id = installation_id
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _app_jwt(self) -> str:
+        try:
+            import jwt
+        except ImportError:
+            raise TokenPoolError(
+                "GitHub App credentials need PyJWT: pip install 'pyjwt[crypto]'"
+            ) from None
+
+        now = int(time.time())
+        # backdated for clock drift; GitHub allows at most 10 minutes
+        payload = {"iat": now - 60, "exp": now + 9 * 60, "iss": self.app_id}
+        return jwt.encode(payload, self.private_key, algorithm="RS256")
+
+    async def token(self, client: httpx.AsyncClient) -> str:
+        async with self._lock:
+            if self._token is None or time.time() > self._expires_at - TOKEN_REFRESH_MARGIN:
+                response = await client.post(
+                    f"{API_URL}/app/installations/{self.installation_id}/access_tokens",
+                    headers={
+                        "Authorization": f"Bearer {self._app_jwt()}",
+                        "Accept": "application/vnd.github+json",
+                    },
+                )
+                if response.status_code != 201:
+                    raise TokenPoolError(
+                        f"Could not mint a token for {self.name}: HTTP {response.status_code}"
+                    )
+                data = response.json()
+                self._token = data["token"]
+                self._expires_at = _parse_expiry(data.get("expires_at"))
+            return self._token
+
+    def pygithub_auth(self):
+        from github import Auth
+
+        return Auth.AppAuth(self.app_id, self.private_key).get_installation_auth(
+            int(self.installation_id)
+        )
+
+
+def _parse_expiry(value: str | None) -> float:
+    if not value:
+        return time.time() + 55 * 60
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    return response.status_code in (403, 429) and (
+        "Retry-After" in response.headers
+        or response.headers.get("X-RateLimit-Remaining") == "0"
+    )
+
+
+class TokenPool:
+    def __init__(self, credentials: list[Credential], reserve: int = RATE_LIMIT_RESERVE):
+        if not credentials:
+            raise TokenPoolError("No GitHub credentials configured")
+        self.credentials = credentials
+        self.reserve = reserve
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def _headroom(self, credential: Credential, resource: str, now: float) -> float | None:
+        """Requests left above the reserve, or None while unusable."""
+        limit = credential.limit(resource)
+        if now < limit.blocked_until:
+            return None
+        if limit.remaining is None or now >= limit.reset_at:
+            return float("inf")
+        if limit.remaining <= self.reserve:
+            return None
+        return limit.remaining - self.reserve
+
+    def _next_available(self, resource: str, now: float) -> float:
+        waits = []
+        for credential in self.credentials:
+            limit = credential.limit(resource)
+            until = limit.blocked_until
+            if limit.remaining is not None and limit.remaining <= self.reserve:
+                until = max(until, limit.reset_at)
+            waits.append(max(until - now, 0))
+        return min(waits)
+
+    def best(self, resource: str = "core") -> Credential | None:
+        """The credential with the most headroom right now, if any."""
+        now = time.time()
+        usable = [
+            (headroom, credential)
+            for credential in self.credentials
+            if (headroom := self._headroom(credential, resource, now)) is not None
+        ]
+        if not usable:
+            return None
+        return max(usable, key=lambda item: item[0])[1]
+
+    async def acquire(
+        self, resource: str = "core", max_wait: float | None = None
+    ) -> Credential:
+        """
+        Reserve one request on the credential with the most headroom,
+        waiting (at most max_wait seconds) while all of them are limited.
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+
+        while True:
+            async with self._lock:
+                credential = self.best(resource)
+                if credential is not None:
+                    limit = credential.limit(resource)
+                    if limit.remaining is not None and time.time() < limit.reset_at:
+                        limit.remaining -= 1
+                    return credential
+
+                delay = self._next_available(resource, time.time()) + 1
+
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise RateLimitExhausted(delay)
+
+            logger.warning(f"All GitHub credentials rate limited, waiting {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+    def release(self, credential: Credential, response: httpx.Response | None) -> None:
+        """Record the rate-limit headers of the response credential got."""
+        if response is None:
+            return
+
+        headers = response.headers
+        limit = credential.limit(headers.get("X-RateLimit-Resource", "core"))
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None:
+            limit.remaining = int(remaining)
+        if reset is not None:
+            limit.reset_at = float(reset)
+
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None and response.status_code in (403, 429):
+            limit.blocked_until = time.time() + float(retry_after)
+
+    async def auth_headers(
+        self, credential: Credential, client: httpx.AsyncClient
+    ) -> dict:
+        return {"Authorization": f"Bearer {await credential.token(client)}"}
+
+    def snapshot(self) -> list[dict]:
+        now = time.time()
+        return [
+            {
+                "credential": credential.name,
+                "kind": credential.kind,
+                "limits": {
+                    resource: {
+                        "remaining": limit.remaining,
+                        "reset_in": max(round(limit.reset_at - now), 0),
+                        "blocked_for": max(round(limit.blocked_until - now), 0),
+                    }
+                    for resource, limit in credential.limits.items()
+                },
+            }
+            for credential in self.credentials
+        ]
+
+
+def _split(value: str | None) -> list[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def build_credentials(
+    tokens: list[str],
+    app_id: str | None = None,
+    private_key: str | None = None,
+    installation_ids: list[str] | None = None,
+) -> list[Credential]:
+    credentials: list[Credential] = [
+        TokenCredential(token, f"token {index + 1}")
+        for index, token in enumerate(dict.fromkeys(tokens))
+    ]
+    if app_id and private_key:
+        credentials += [
+            AppCredential(app_id, private_key, installation_id)
+            for installation_id in installation_ids or []
+        ]
+    return credentials
+
+
+def pool_from_config(
+    token: str = "",
+    tokens: str = "",
+    app_id: str = "",
+    private_key_path: str = "",
+    installation_ids: str = "",
+    reserve: int = RATE_LIMIT_RESERVE,
+) -> TokenPool:
+    private_key = Path(private_key_path).read_text() if private_key_path else None
+    return TokenPool(
+        build_credentials(
+            _split(token) + _split(tokens),
+            app_id,
+            private_key,
+            _split(installation_ids),
+        ),
+        reserve,
+    )
+
+
+def pool_from_env(reserve: int = RATE_LIMIT_RESERVE) -> TokenPool:
+    return pool_from_config(
+        os.getenv("GITHUB_TOKEN", ""),
+        os.getenv("GITHUB_TOKENS", ""),
+        os.getenv("GITHUB_APP_ID", ""),
+        os.getenv("GITHUB_APP_PRIVATE_KEY_PATH", ""),
+        os.getenv("GITHUB_APP_INSTALLATION_IDS", ""),
+        reserve,
+    )
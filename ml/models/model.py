@@ -1,56 +1,361 @@
-# TODO 
-# Build Random Forest Classifier
-# Train it on X_train and y_train
-# Evaluate on X_test and y_test
-# Get feature importance rankings
+# Random Forest training: stratified k-fold CV over a hyperparameter grid,
+# run in parallel across all cores, then a final fit of the best
+# configuration with a tuned decision threshold.
+#
+#   python -m ml.models.model --grid full --folds 5 --publish
 
-from tkinter.constants import N
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 import joblib
-from sklearn.model_selection import train_test_split
+from joblib import Parallel, delayed
+from sklearn.calibration import calibration_curve
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report, roc_auc_score
+from sklearn.metrics import (
+  average_precision_score,
+  brier_score_loss,
+  classification_report,
+  precision_recall_curve,
+  roc_auc_score,
+)
 
-# load the data
-df = pd.read_csv("../data/processed/processed_data.csv")
+MODEL_DIR = Path(__file__).resolve().parent
 
-# test train split
-X = df.drop("is_risky", axis=1)
-y = df["is_risky"]
+# allow running as a plain script (python model.py) as well as with -m
+if __package__ in (None, ""):
+  sys.path.insert(0, str(MODEL_DIR.parents[1]))
 
-X_train, X_test, y_train, y_test = train_test_split(
-  X, y, test_size=0.2, random_state=42, stratify=y
-)
+DATA_FILE = MODEL_DIR.parent / "data" / "processed" / "processed_data.parquet"
+FOREST_DIR = MODEL_DIR / "rf_forest"
 
-# train
-model = RandomForestClassifier(
-  n_estimators=200,
-  random_state=42,
-  class_weight="balanced",
-  n_jobs=1
-)
-model.fit(X_train, y_train)
+FOREST_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
 
-y_pred = model.predict(X_test)
-y_prob = model.predict_proba(X_test)[:, 1]
 
-threshold = 0.3
-y_pred_adj = (y_prob > threshold).astype(int)
+def flatten_forest(model: RandomForestClassifier) -> dict:
+  """
+  Flatten every tree into shared contiguous node arrays.
 
-print(classification_report(y_test, y_pred_adj))
-print(f"ROC AUC: , {roc_auc_score(y_test, y_prob):.4f}")
+  Nodes of all trees are concatenated; roots holds each tree's first node.
+  Leaves point to themselves on both sides, which is how the evaluator
+  recognises them. value is the risky-class probability at each node,
+  normalised exactly like predict_proba.
+  """
+  features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+  offset = 0
+  max_depth = 0
 
-# feature importances
-importances = sorted(
-  zip(X.columns, model.feature_importances_),
-  key=lambda x:x[1],
-  reverse=True
-)
+  for estimator in model.estimators_:
+    tree = estimator.tree_
+    nodes = np.arange(tree.node_count)
+    is_leaf = tree.children_left == -1
+
+    value = tree.value[:, 0, :]
+    totals = value.sum(axis=1)
+    totals[totals == 0.0] = 1.0
+
+    features.append(np.where(is_leaf, 0, tree.feature))
+    thresholds.append(tree.threshold)
+    lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+    rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+    values.append(value[:, 1] / totals)
+    roots.append(offset)
+
+    offset += tree.node_count
+    max_depth = max(max_depth, tree.max_depth)
+
+  return {
+    "feature": np.concatenate(features).astype(np.intp),
+    "threshold": np.concatenate(thresholds).astype(np.float64),
+    "left": np.concatenate(lefts).astype(np.intp),
+    "right": np.concatenate(rights).astype(np.intp),
+    "value": np.concatenate(values).astype(np.float64),
+    "roots": np.array(roots, dtype=np.intp),
+    "max_depth": max_depth,
+    "importances": model.feature_importances_.tolist(),
+  }
+
+
+def export_forest(
+  model: RandomForestClassifier,
+  feature_columns: list,
+  out_dir: Path = FOREST_DIR,
+  X_check: pd.DataFrame | None = None,
+) -> Path:
+  """
+  Write the flattened forest as .npy arrays plus meta.json, then check the
+  exported engine reproduces sklearn's predict_proba bit for bit.
+  """
+  from ml.apis.predict import forest_predict, load_forest
+
+  forest = flatten_forest(model)
+  out_dir = Path(out_dir)
+  out_dir.mkdir(parents=True, exist_ok=True)
+
+  for name in FOREST_ARRAYS:
+    np.save(out_dir / f"{name}.npy", np.ascontiguousarray(forest[name]))
+
+  meta = {
+    "feature_columns": list(feature_columns),
+    "n_trees": len(model.estimators_),
+    "max_depth": forest["max_depth"],
+    "importances": forest["importances"],
+  }
+  (out_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+  if X_check is not None:
+    exported = load_forest(out_dir)
+    X = np.asarray(X_check[list(feature_columns)], dtype=np.float64)
+    probs, _ = forest_predict(exported, X, contributions=False)
+    expected = model.predict_proba(X_check[list(feature_columns)])[:, 1]
+
+    if not np.array_equal(probs, expected):
+      mismatches = int(np.sum(probs != expected))
+      raise ValueError(f"Exported forest differs from sklearn on {mismatches} rows")
+
+    print(f"Exported forest verified bit-for-bit on {len(X)} rows")
+
+  return out_dir
+
+
+PARAM_GRIDS = {
+  "small": {
+    "n_estimators": [200],
+    "max_depth": [None, 16],
+    "min_samples_leaf": [1, 5],
+  },
+  "full": {
+    "n_estimators": [200, 400],
+    "max_depth": [None, 12, 20],
+    "min_samples_leaf": [1, 3, 10],
+    "max_features": ["sqrt", 0.5],
+  },
+}
+CALIBRATION_BINS = 10
+
+
+def _fit_fold(params: dict, X: np.ndarray, y: np.ndarray, train_idx, test_idx, seed: int):
+  # runs in a loky worker; one core per fit, parallelism comes from the pool
+  start = time.perf_counter()
+  model = RandomForestClassifier(
+    random_state=seed, class_weight="balanced", n_jobs=1, **params
+  )
+  model.fit(X[train_idx], y[train_idx])
+  fit_seconds = time.perf_counter() - start
+
+  return test_idx, model.predict_proba(X[test_idx])[:, 1], fit_seconds
+
+
+def calibration_report(y: np.ndarray, prob: np.ndarray, bins: int = CALIBRATION_BINS) -> dict:
+  """
+  Brier score, expected calibration error and the reliability curve
+  """
+  frac_pos, mean_pred = calibration_curve(y, prob, n_bins=bins, strategy="uniform")
+  # calibration_curve's binning: a probability on an edge goes to the bin
+  # below it (np.histogram would put it in the bin above)
+  edges = np.linspace(0, 1, bins + 1)
+  counts = np.bincount(np.searchsorted(edges[1:-1], prob, side="left"), minlength=bins)
+  counts = counts[counts > 0]
+  ece = float(np.sum(counts / len(prob) * np.abs(frac_pos - mean_pred)))
+
+  return {
+    "brier": float(brier_score_loss(y, prob)),
+    "ece": ece,
+    "curve": {
+      "mean_predicted": mean_pred.round(4).tolist(),
+      "fraction_positive": frac_pos.round(4).tolist(),
+    },
+  }
+
+
+def best_threshold(y: np.ndarray, prob: np.ndarray) -> dict:
+  """
+  Threshold maximising F1 on out-of-fold probabilities
+  """
+  precision, recall, thresholds = precision_recall_curve(y, prob)
+  f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-12)
+  i = int(np.argmax(f1[:-1]))
+
+  return {
+    "threshold": float(thresholds[i]),
+    "f1": float(f1[i]),
+    "precision": float(precision[i]),
+    "recall": float(recall[i]),
+  }
+
+
+def cross_validate(
+  X: np.ndarray,
+  y: np.ndarray,
+  grid: dict,
+  folds: int = 5,
+  n_jobs: int = -1,
+  seed: int = 42,
+) -> list:
+  """
+  Evaluate every configuration with stratified k-fold CV. All
+  (configuration, fold) fits run in one process pool, so every core stays
+  busy until the last fit finishes.
+  """
+  configs = list(ParameterGrid(grid))
+  splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+
+  start = time.perf_counter()
+  outputs = Parallel(n_jobs=n_jobs, backend="loky", verbose=5)(
+    delayed(_fit_fold)(params, X, y, train_idx, test_idx, seed)
+    for params in configs
+    for train_idx, test_idx in splits
+  )
+  print(f"Cross-validated {len(configs)} configurations in {time.perf_counter() - start:.1f}s")
+
+  results = []
+  for c, params in enumerate(configs):
+    oof = np.empty(len(y))
+    fold_roc, fold_pr, fit_seconds = [], [], []
+
+    for test_idx, prob, seconds in outputs[c * folds:(c + 1) * folds]:
+      oof[test_idx] = prob
+      fold_roc.append(roc_auc_score(y[test_idx], prob))
+      fold_pr.append(average_precision_score(y[test_idx], prob))
+      fit_seconds.append(seconds)
+
+    results.append({
+      "params": params,
+      "roc_auc": float(np.mean(fold_roc)),
+      "roc_auc_std": float(np.std(fold_roc)),
+      "pr_auc": float(np.mean(fold_pr)),
+      "pr_auc_std": float(np.std(fold_pr)),
+      "fit_seconds": float(np.sum(fit_seconds)),
+      "calibration": calibration_report(y, oof),
+      "threshold": best_threshold(y, oof),
+    })
+
+  return results
+
+
+def main():
+  from ml.data.dataset_store import load_processed
+  from ml.data.features import FEATURE_COLUMNS
+
+  parser = argparse.ArgumentParser(description="Train the PR risk model")
+  parser.add_argument("--data", default=str(DATA_FILE))
+  parser.add_argument("--out", default=str(MODEL_DIR))
+  parser.add_argument("--grid", choices=sorted(PARAM_GRIDS), default="small")
+  parser.add_argument("--folds", type=int, default=5)
+  parser.add_argument("--metric", choices=["roc_auc", "pr_auc"], default="roc_auc")
+  parser.add_argument("--n-jobs", type=int, default=-1)
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument(
+    "--publish", action="store_true",
+    help="publish the model to the registry and make it current",
+  )
+  args = parser.parse_args()
+
+  out_dir = Path(args.out)
+
+  # load the data (Parquet when converted, CSV otherwise)
+  df = load_processed(args.data, columns=FEATURE_COLUMNS + ["is_risky"])
+
+  # test train split
+  X = df[FEATURE_COLUMNS]
+  y = df["is_risky"]
+
+  X_train, X_test, y_train, y_test = train_test_split(
+    X, y, test_size=0.2, random_state=args.seed, stratify=y
+  )
+
+  results = cross_validate(
+    X_train.to_numpy(dtype=np.float64),
+    y_train.to_numpy(),
+    PARAM_GRIDS[args.grid],
+    folds=args.folds,
+    n_jobs=args.n_jobs,
+    seed=args.seed,
+  )
+  results.sort(key=lambda r: r[args.metric], reverse=True)
+
+  print(f"{'roc_auc':>8} {'pr_auc':>8} {'brier':>7} {'fit_s':>7}  params")
+  for r in results:
+    print(
+      f"{r['roc_auc']:8.4f} {r['pr_auc']:8.4f} {r['calibration']['brier']:7.4f} "
+      f"{r['fit_seconds']:7.1f}  {r['params']}"
+    )
+
+  best = results[0]
+  threshold = best["threshold"]["threshold"]
+  print(f"Best by {args.metric}: {best['params']}, threshold {threshold:.3f}")
+
+  # final fit uses every core
+  start = time.perf_counter()
+  model = RandomForestClassifier(
+    random_state=args.seed,
+    class_weight="balanced",
+    n_jobs=args.n_jobs,
+    **best["params"],
+  )
+  model.fit(X_train, y_train)
+  train_seconds = time.perf_counter() - start
+  model.set_params(n_jobs=1)
+
+  y_prob = model.predict_proba(X_test)[:, 1]
+  # >= like precision_recall_curve, which picked the threshold
+  y_pred_adj = (y_prob >= threshold).astype(int)
+
+  print(classification_report(y_test, y_pred_adj))
+  print(f"ROC AUC: {roc_auc_score(y_test, y_prob):.4f}")
+  print(f"PR AUC: {average_precision_score(y_test, y_prob):.4f}")
+
+  # feature importances
+  importances = sorted(
+    zip(X.columns, model.feature_importances_),
+    key=lambda x:x[1],
+    reverse=True
+  )
+
+  print("Important features")
+  for feat, imp in importances:
+    print(f"{feat}: {imp}")
+
+  out_dir.mkdir(parents=True, exist_ok=True)
+  joblib.dump(model, out_dir / "rf_model.joblib")
+  joblib.dump(list(X.columns), out_dir / "feature_columns.joblib")
+  print("Model and feature columns saved")
+
+  export_forest(model, list(X.columns), out_dir / FOREST_DIR.name, X_check=X_test)
+  print(f"Flattened forest saved to {out_dir / FOREST_DIR.name}")
+
+  meta = {
+    "trained_at": datetime.now(timezone.utc).isoformat(),
+    "data": str(args.data),
+    "n_train": len(X_train),
+    "n_test": len(X_test),
+    "feature_columns": list(X.columns),
+    "params": best["params"],
+    "selection_metric": args.metric,
+    "threshold": best["threshold"],
+    "train_seconds": train_seconds,
+    "test": {
+      "roc_auc": float(roc_auc_score(y_test, y_prob)),
+      "pr_auc": float(average_precision_score(y_test, y_prob)),
+      "calibration": calibration_report(y_test.to_numpy(), y_prob),
+    },
+    "cv": {"folds": args.folds, "grid": args.grid, "results": results},
+  }
+  (out_dir / "training_meta.json").write_text(json.dumps(meta, indent=2))
+  print(f"Training metadata saved to {out_dir / 'training_meta.json'}")
+
+  if args.publish:
+    from ml.models.registry import publish
+
+    version = publish(out_dir / FOREST_DIR.name, meta)
+    print(f"Published model version {version}")
 
-print("Important features")
-for feat, imp in importances:
-  print(f"{feat}: {imp}")
 
-joblib.dump(model, "rf_model.joblib")
-joblib.dump(list(X.columns), "feature_columns.joblib")
-print("Model and feature columns saved")
\ No newline at end of file
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,179 @@
+# Versioned model registry.
+#
+#   registry/
+#     CURRENT                  name of the active version
+#     20261018T120000Z/        flattened forest (.npy + meta.json)
+#       manifest.json          features, training metrics, checksum
+#
+# Versions are immutable once published. Publishing copies into a temporary
+# directory and renames it into place, and CURRENT is replaced atomically, so
+# a server watching the registry never sees a half-written version.
+#
+#   python -m ml.models.registry publish ml/models/rf_forest --meta ml/models/training_meta.json
+#   python -m ml.models.registry list
+#   python -m ml.models.registry activate 20261018T120000Z
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).resolve().parent
+REGISTRY_DIR = MODEL_DIR / "registry"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+FOREST_FILES = (
+  "feature.npy", "threshold.npy", "left.npy", "right.npy", "value.npy",
+  "roots.npy", "meta.json",
+)
+
+
+class RegistryError(Exception):
+  pass
+
+
+def checksum(directory: Path) -> str:
+  """
+  sha256 over the forest files, in a fixed order
+  """
+  digest = hashlib.sha256()
+  for name in FOREST_FILES:
+    digest.update(name.encode())
+    with open(Path(directory) / name, "rb") as f:
+      for chunk in iter(lambda: f.read(1 << 20), b""):
+        digest.update(chunk)
+  return digest.hexdigest()
+
+
+def version_dir(version: str, registry: Path = REGISTRY_DIR) -> Path:
+  return Path(registry) / version
+
+
+def versions(registry: Path = REGISTRY_DIR) -> list:
+  registry = Path(registry)
+  if not registry.exists():
+    return []
+  return sorted(p.name for p in registry.iterdir() if (p / MANIFEST_FILE).exists())
+
+
+def read_manifest(version: str, registry: Path = REGISTRY_DIR) -> dict:
+  path = version_dir(version, registry) / MANIFEST_FILE
+  if not path.exists():
+    raise RegistryError(f"Unknown model version: {version}")
+  return json.loads(path.read_text())
+
+
+def verify(version: str, registry: Path = REGISTRY_DIR) -> dict:
+  """
+  Return the manifest of version, after checking its files against the
+  recorded checksum
+  """
+  manifest = read_manifest(version, registry)
+  actual = checksum(version_dir(version, registry))
+  if actual != manifest["checksum"]:
+    raise RegistryError(f"Checksum mismatch for model version {version}")
+  return manifest
+
+
+def current_version(registry: Path = REGISTRY_DIR) -> str | None:
+  path = Path(registry) / CURRENT_FILE
+  if not path.exists():
+    return None
+  return path.read_text().strip() or None
+
+
+def _write_atomic(path: Path, text: str) -> None:
+  tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+  tmp.write_text(text)
+  os.replace(tmp, path)
+
+
+def set_current(version: str, registry: Path = REGISTRY_DIR) -> None:
+  verify(version, registry)
+  _write_atomic(Path(registry) / CURRENT_FILE, version + "\n")
+
+
+def publish(
+  forest_dir: Path,
+  training_meta: dict | None = None,
+  version: str | None = None,
+  activate: bool = True,
+  registry: Path = REGISTRY_DIR,
+) -> str:
+  """
+  Copy an exported forest into the registry as a new version
+  """
+  registry = Path(registry)
+  version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+  target = version_dir(version, registry)
+  if target.exists():
+    raise RegistryError(f"Model version {version} already exists")
+
+  staging = registry / f".staging-{uuid.uuid4().hex}"
+  staging.mkdir(parents=True)
+  try:
+    for name in FOREST_FILES:
+      shutil.copy2(Path(forest_dir) / name, staging / name)
+
+    forest_meta = json.loads((staging / "meta.json").read_text())
+    training_meta = training_meta or {}
+    manifest = {
+      "version": version,
+      "published_at": datetime.now(timezone.utc).isoformat(),
+      "feature_columns": forest_meta["feature_columns"],
+      "n_trees": forest_meta["n_trees"],
+      "params": training_meta.get("params"),
+      "threshold": training_meta.get("threshold"),
+      "metrics": training_meta.get("test"),
+      "trained_at": training_meta.get("trained_at"),
+      "checksum": checksum(staging),
+    }
+    (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    os.replace(staging, target)
+  finally:
+    shutil.rmtree(staging, ignore_errors=True)
+
+  if activate:
+    set_current(version, registry)
+
+  return version
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Manage model versions")
+  parser.add_argument("--registry", default=str(REGISTRY_DIR))
+  sub = parser.add_subparsers(dest="command", required=True)
+  publish_cmd = sub.add_parser("publish", help="Publish an exported forest")
+  publish_cmd.add_argument("forest_dir")
+  publish_cmd.add_argument("--meta", help="training_meta.json written by model.py")
+  publish_cmd.add_argument("--version")
+  publish_cmd.add_argument("--no-activate", action="store_true")
+  sub.add_parser("list", help="List published versions")
+  activate_cmd = sub.add_parser("activate", help="Make a version current")
+  activate_cmd.add_argument("version")
+  args = parser.parse_args()
+
+  if args.command == "publish":
+    meta = json.loads(Path(args.meta).read_text()) if args.meta else None
+    version = publish(
+      args.forest_dir, meta, args.version, not args.no_activate, args.registry
+    )
+    print(f"Published model version {version}")
+  elif args.command == "list":
+    current = current_version(args.registry)
+    for version in versions(args.registry):
+      metrics = read_manifest(version, args.registry).get("metrics") or {}
+      marker = "*" if version == current else " "
+      print(f"{marker} {version}  roc_auc={metrics.get('roc_auc')}")
+  elif args.command == "activate":
+    set_current(args.version, args.registry)
+    print(f"Model version {args.version} is now current")
+
+
+if __name__ == "__main__":
+  main()
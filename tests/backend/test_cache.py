@@ -0,0 +1,79 @@
+"""
+SQLiteCache (backend/app/core/cache.py): async access runs on the cache's
+worker thread, and hits only rewrite accessed_at once it has gone stale.
+"""
+
+import asyncio
+import threading
+import time
+
+from backend.app.core.cache import (
+    ACCESS_UPDATE_INTERVAL,
+    MemoryCache,
+    SQLiteCache,
+    TieredCache,
+)
+
+
+def _accessed_at(cache: SQLiteCache, key: str) -> float:
+    return cache._conn.execute(
+        "SELECT accessed_at FROM cache WHERE key = ?", (key,)
+    ).fetchone()[0]
+
+
+def test_async_access_runs_off_the_event_loop(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.db", 1 << 20)
+    threads = []
+    get = cache.get
+
+    def spy(key):
+        threads.append(threading.get_ident())
+        return get(key)
+
+    cache.get = spy
+
+    async def main():
+        await cache.aset("k", b"v")
+        return await cache.aget("k")
+
+    try:
+        assert asyncio.run(main()) == b"v"
+        assert threads and threading.get_ident() not in threads
+    finally:
+        cache.close()
+
+
+def test_hits_only_touch_stale_rows(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.db", 1 << 20)
+    try:
+        cache.set("k", b"v")
+        stored = _accessed_at(cache, "k")
+
+        assert cache.get("k") == b"v"
+        assert _accessed_at(cache, "k") == stored
+
+        stale = time.time() - ACCESS_UPDATE_INTERVAL - 1
+        cache._conn.execute("UPDATE cache SET accessed_at = ?", (stale,))
+        cache._conn.commit()
+
+        assert cache.get("k") == b"v"
+        assert _accessed_at(cache, "k") > stale
+    finally:
+        cache.close()
+
+
+def test_tiered_aget_promotes_disk_hits(tmp_path):
+    disk = SQLiteCache(tmp_path / "cache.db", 1 << 20)
+    cache = TieredCache(MemoryCache(1 << 10), disk)
+    disk.set("k", b"v")
+
+    async def main():
+        value = await cache.aget("k")
+        promoted = cache.memory.get("k")
+        await cache.adelete("k")
+        return value, promoted, await cache.aget("k")
+
+    try:
+        assert asyncio.run(main()) == (b"v", b"v", None)
+    finally:
+        cache.close()
@@ -0,0 +1,144 @@
+"""
+Incremental re-analysis (backend/app/services/analysis_store.py): unchanged
+files must not be sent to the LLM again, neither on a re-analysis of the
+same PR nor when another PR carries the same patches.
+"""
+
+import asyncio
+import types
+
+import httpx
+import pytest
+
+import ml.apis.llm as llm
+from backend.app.api.v1 import analyze
+from backend.app.services import analysis_store, github_service
+from ml.apis import review_cache
+
+# more files than the fetch keeps patches for
+N_FILES = analyze.MAX_PATCH_FILES + 10
+
+
+def _file(i: int) -> dict:
+    return {
+        "filename": f"src/f{i}.py",
+        "sha": f"blob{i}",
+        "status": "modified",
+        "additions": 40 + i,
+        "deletions": 10,
+        "patch": f"@@ -1,3 +1,4 @@\n ctx\n-old = {i}\n+new = {i}\n+token = {i}\n ctx",
+    }
+
+
+def _pr(number: int, head: str) -> dict:
+    return {
+        "number": number,
+        "html_url": f"https://github.com/o/r/pull/{number}",
+        "title": "Change things",
+        "body": "",
+        "created_at": "2024-01-02T10:00:00Z",
+        "user": {"created_at": "2020-01-01T00:00:00Z"},
+        "labels": [],
+        "milestone": None,
+        "additions": 1000,
+        "deletions": 300,
+        "changed_files": N_FILES,
+        "commits": 2,
+        "head": {"sha": head},
+        "base": {"sha": "base"},
+        "author_association": "CONTRIBUTOR",
+        "requested_reviewers": [],
+        "draft": False,
+    }
+
+
+class FakeModels:
+    def __init__(self):
+        self.reviews = 0
+        self.summaries = 0
+
+    async def generate_content(self, model, contents, config):
+        if config["response_schema"] is llm.SUMMARY_SCHEMA:
+            self.summaries += 1
+            return types.SimpleNamespace(
+                parsed={"risk_explanation": "summary", "mitigation_steps": ["s"]}
+            )
+
+        self.reviews += 1
+        file_reviews = [
+            {"file": name, "issues": [{"description": f"issue in {name}"}]}
+            for name in analyze.packed_files(contents)
+        ]
+        return types.SimpleNamespace(
+            parsed={
+                "risk_explanation": "review",
+                "mitigation_steps": ["m"],
+                "file_reviews": file_reviews,
+            }
+        )
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"heads": {1: "h1", 2: "h2"}}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        number = int(path.split("/pulls/")[1].split("/")[0]) if "/pulls/" in path else 0
+        if path.endswith("/files"):
+            return httpx.Response(200, json=[_file(i) for i in range(N_FILES)])
+        if "/pulls/" in path:
+            return httpx.Response(200, json=_pr(number, state["heads"][number]))
+        return httpx.Response(404, json={})
+
+    async def predict_risk(ml_input, routing_key=None):
+        return {
+            "risk_score": 8.0,
+            "risk_label": "HIGH",
+            "top_risk_factors": ["additions"],
+            "model_version": "test",
+        }
+
+    models = FakeModels()
+    monkeypatch.setattr(github_service, "_client", httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ))
+    monkeypatch.setattr(analyze, "predict_risk", predict_risk)
+    monkeypatch.setattr(llm, "client", types.SimpleNamespace(
+        aio=types.SimpleNamespace(models=models)
+    ))
+    review_cache.set_backend(None)
+    analysis_store.close_store()
+    yield models
+    analysis_store.close_store()
+
+
+def _analyze(number: int) -> dict:
+    return asyncio.run(
+        analyze.run_pr_analysis(f"https://github.com/o/r/pull/{number}")
+    )
+
+
+def test_unchanged_large_pr_makes_no_llm_call(env):
+    first = _analyze(1)
+    assert env.reviews >= 1
+    assert first["review_comments"]["source"] == "llm"
+    calls = (env.reviews, env.summaries)
+
+    second = _analyze(1)
+
+    assert (env.reviews, env.summaries) == calls
+    assert second["review_comments"]["cached"] is True
+    assert second["review_comments"]["file_reviews"] == first["review_comments"]["file_reviews"]
+
+
+def test_cherry_picked_pr_only_gets_a_summary(env):
+    first = _analyze(1)
+    reviews = env.reviews
+
+    other = _analyze(2)
+
+    assert env.reviews == reviews
+    assert env.summaries >= 1
+    assert other["review_comments"]["risk_explanation"] == "summary"
+    assert other["review_comments"]["file_reviews"] == first["review_comments"]["file_reviews"]
@@ -0,0 +1,5 @@
+import os
+
+# settings are read at import time; the backend needs these to import
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("GITHUB_TOKEN", "test")
@@ -0,0 +1,205 @@
+"""
+Parity tests for ml/data/features.py: the vectorized and single-row paths
+must agree exactly, and both must reproduce the features the model was
+trained on (the eda.ipynb processing steps) and served with (the original
+hand-written prepare_features).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.data.features import (
+    ASSOC_MAP,
+    EDGE_CASES,
+    FEATURE_COLUMNS,
+    FLOAT_FEATURES,
+    check_parity,
+    risk_target,
+    transform,
+    transform_one,
+)
+
+# fully populated rows, as mined; between them they use every association
+# so the notebook's LabelEncoder sees the full training vocabulary
+SAMPLE_ROWS = [
+    {
+        "is_draft": False, "author_account_age_days": 2210, "additions": 120,
+        "deletions": 30, "changed_files": 4, "commits_count": 3,
+        "created_day_of_week": 2, "created_hour": 14, "requested_reviewers_count": 2,
+        "body": "Fixes the retry loop", "title": "Fix retries", "labels": "bug",
+        "milestone": "v1.2", "file_extensions": ".py", "author_association": "MEMBER",
+    },
+    {
+        "is_draft": True, "author_account_age_days": 15, "additions": 0,
+        "deletions": 0, "changed_files": 0, "commits_count": 1,
+        "created_day_of_week": 6, "created_hour": 23, "requested_reviewers_count": 0,
+        "body": "", "title": "WIP", "labels": "none",
+        "milestone": "none", "file_extensions": "none", "author_association": "NONE",
+    },
+    {
+        "is_draft": False, "author_account_age_days": 980, "additions": 4031,
+        "deletions": 2870, "changed_files": 212, "commits_count": 57,
+        "created_day_of_week": 5, "created_hour": 9, "requested_reviewers_count": 5,
+        "body": "Large refactor\n\n" + "details " * 300, "title": "Refactor the storage layer",
+        "labels": "refactor,breaking", "milestone": "none", "file_extensions": ".py,.toml,.md",
+        "author_association": "OWNER",
+    },
+    {
+        "is_draft": False, "author_account_age_days": 400, "additions": 7,
+        "deletions": 19, "changed_files": 1, "commits_count": 2,
+        "created_day_of_week": 0, "created_hour": 17, "requested_reviewers_count": 1,
+        "body": "Typo", "title": "docs: typo", "labels": "docs",
+        "milestone": "none", "file_extensions": ".md", "author_association": "CONTRIBUTOR",
+    },
+    {
+        "is_draft": False, "author_account_age_days": 3650, "additions": 55,
+        "deletions": 1, "changed_files": 3, "commits_count": 9,
+        "created_day_of_week": 4, "created_hour": 8, "requested_reviewers_count": 0,
+        "body": "Adds a flag", "title": "Add --dry-run", "labels": "none",
+        "milestone": "v2.0", "file_extensions": ".py", "author_association": "COLLABORATOR",
+    },
+]
+
+
+def _notebook_features(raw: pd.DataFrame) -> pd.DataFrame:
+    """The processing steps of ml/models/eda.ipynb, cell for cell"""
+    from sklearn.preprocessing import LabelEncoder
+
+    df = raw.copy()
+    df["body"] = df["body"].fillna("")
+    df["labels"] = df["labels"].fillna("none")
+    df["milestone"] = df["milestone"].fillna("none")
+    df["file_extensions"] = df["file_extensions"].fillna("none")
+    df["body_len"] = df["body"].str.len()
+    df.loc[df["body"] == "", "body_len"] = 0
+
+    df["has_body"] = (df["body"] != "").astype(int)
+    df["has_labels"] = (df["labels"] != "none").astype(int)
+    df["has_milestone"] = (df["milestone"] != "none").astype(int)
+    df["has_file_extensions"] = (df["file_extensions"] != "none").astype(int)
+
+    df["total_changes"] = df["additions"] + df["deletions"]
+    df["change_ratio"] = df["additions"] / (df["deletions"] + 1)
+    df["avg_changes_per_file"] = df["total_changes"] / (df["changed_files"] + 1)
+    df["commits_per_file"] = df["commits_count"] / (df["changed_files"] + 1)
+    df["title_length"] = df["title"].str.len()
+    df["is_weekend"] = (df["created_day_of_week"] >= 5).astype(int)
+    df["is_business_hours"] = (
+        (df["created_hour"] >= 9) & (df["created_hour"] <= 17)
+    ).astype(int)
+
+    df["author_association_encoded"] = LabelEncoder().fit_transform(df["author_association"])
+    df["is_draft"] = df["is_draft"].astype(int)
+    return df[FEATURE_COLUMNS]
+
+
+def _legacy_prepare_features(pr_data: dict) -> dict:
+    """ml/apis/predict.py's prepare_features before the shared pipeline"""
+    additions = pr_data.get("additions", 0)
+    deletions = pr_data.get("deletions", 0)
+    changed_files = pr_data.get("changed_files", 0)
+    commits_count = pr_data.get("commits_count", 0)
+    body = pr_data.get("body") or ""
+    title = pr_data.get("title", "")
+    labels = pr_data.get("labels") or "none"
+    milestone = pr_data.get("milestone") or "none"
+    file_extensions = pr_data.get("file_extensions") or "none"
+    created_day_of_week = pr_data.get("created_day_of_week", 0)
+    created_hour = pr_data.get("created_hour", 0)
+    total_changes = additions + deletions
+
+    return {
+        "is_draft": int(pr_data.get("is_draft", False)),
+        "author_account_age_days": pr_data.get("author_account_age_days", 0),
+        "additions": additions,
+        "deletions": deletions,
+        "changed_files": changed_files,
+        "commits_count": commits_count,
+        "body_len": len(body),
+        "created_day_of_week": created_day_of_week,
+        "created_hour": created_hour,
+        "requested_reviewers_count": pr_data.get("requested_reviewers_count", 0),
+        "total_changes": total_changes,
+        "change_ratio": additions / (deletions + 1),
+        "avg_changes_per_file": total_changes / (changed_files + 1),
+        "commits_per_file": commits_count / (changed_files + 1),
+        "title_length": len(title),
+        "is_weekend": int(created_day_of_week >= 5),
+        "is_business_hours": int(9 <= created_hour <= 17),
+        "has_body": int(body != ""),
+        "has_labels": int(labels != "none"),
+        "has_milestone": int(milestone != "none"),
+        "has_file_extensions": int(file_extensions != "none"),
+        "author_association_encoded": ASSOC_MAP.get(
+            pr_data.get("author_association", "NONE"), 3
+        ),
+    }
+
+
+@pytest.mark.parametrize("row", EDGE_CASES + SAMPLE_ROWS)
+def test_transform_matches_transform_one(row):
+    batch = transform(pd.DataFrame([row])).iloc[0].to_dict()
+    online = transform_one(row)
+
+    assert list(online) == FEATURE_COLUMNS
+    assert online == batch
+
+
+def test_transform_matches_transform_one_across_rows():
+    # rows with different missing columns share one frame (NaN-filled)
+    raw = pd.DataFrame(EDGE_CASES + SAMPLE_ROWS)
+    batch = transform(raw)
+
+    for i, row in enumerate(raw.to_dict("records")):
+        assert transform_one(row) == batch.iloc[i].to_dict(), f"row {i}"
+
+
+def test_check_parity_finds_no_mismatch():
+    assert check_parity(pd.DataFrame(SAMPLE_ROWS)) == 0
+
+
+def test_transform_dtypes():
+    batch = transform(pd.DataFrame(SAMPLE_ROWS))
+
+    assert list(batch.columns) == FEATURE_COLUMNS
+    for name in FEATURE_COLUMNS:
+        expected = np.float64 if name in FLOAT_FEATURES else np.int64
+        assert batch[name].dtype == expected, name
+
+
+def test_transform_matches_notebook():
+    raw = pd.DataFrame(SAMPLE_ROWS)
+    expected = _notebook_features(raw)
+
+    pd.testing.assert_frame_equal(transform(raw), expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("row", SAMPLE_ROWS)
+def test_transform_one_matches_legacy_prepare_features(row):
+    assert transform_one(row) == _legacy_prepare_features(row)
+
+
+def test_unknown_association_maps_to_none():
+    row = {"author_association": "FIRST_TIME_CONTRIBUTOR"}
+
+    assert transform_one(row)["author_association_encoded"] == ASSOC_MAP["NONE"]
+    assert transform(pd.DataFrame([row]))["author_association_encoded"].iloc[0] == ASSOC_MAP["NONE"]
+
+
+def test_risk_target():
+    df = pd.DataFrame(
+        [
+            (0.0, 0, 0, 0),
+            (70.0, 0, 0, 0),     # not over 70 hours
+            (70.5, 0, 0, 1),
+            (1.0, 2, 0, 0),
+            (1.0, 3, 0, 1),
+            (1.0, 0, 4, 0),
+            (1.0, 0, 5, 1),
+            (200.0, 10, 10, 1),
+        ],
+        columns=["hours_to_merge", "review_comments_count", "issue_comments_count", "expected"],
+    )
+
+    assert risk_target(df).tolist() == df["expected"].tolist()